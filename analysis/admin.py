@@ -0,0 +1,30 @@
+from django.contrib import admin
+
+from .models import AnalysisResult, Run, WindowMetric
+
+
+class AnalysisResultInline(admin.TabularInline):
+    model = AnalysisResult
+    extra = 0
+    fields = ('method', 'step_count', 'average_lean_angle', 'cadence', 'duration_sec', 'created_at')
+    readonly_fields = fields
+
+
+@admin.register(Run)
+class RunAdmin(admin.ModelAdmin):
+    list_display = ('runner_id', 'recorded_at', 'filename', 'file_size', 'content_hash')
+    list_filter = ('recorded_at',)
+    search_fields = ('runner_id', 'content_hash', 'filename')
+    inlines = [AnalysisResultInline]
+
+
+class WindowMetricInline(admin.TabularInline):
+    model = WindowMetric
+    extra = 0
+
+
+@admin.register(AnalysisResult)
+class AnalysisResultAdmin(admin.ModelAdmin):
+    list_display = ('run', 'method', 'step_count', 'average_lean_angle', 'cadence', 'created_at')
+    list_filter = ('method',)
+    inlines = [WindowMetricInline]
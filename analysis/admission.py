@@ -0,0 +1,457 @@
+# 解析エンドポイントのアドミッション制御（クライアント別トークンバケット + 全体の同時実行上限）
+import hashlib
+import hmac
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+MB = 1024 * 1024
+
+# バケットが回復しない設定（補充レート 0）でも返す Retry-After の上限
+MAX_RETRY_AFTER_SECONDS = 3600
+
+# 状態ストアがロックされていて判定できない場合の Retry-After（503）
+STORE_BUSY_RETRY_AFTER_SECONDS = 5
+
+# 満タンになったバケットを削除する間隔（クライアントIPごとの行が増え続けないようにする）
+PRUNE_INTERVAL_SECONDS = 60
+
+# アドミッション制御の対象となるURL名
+ANALYSIS_URL_NAMES = {'analyze_running_video', 'upload_finalize'}
+UPLOAD_URL_NAMES = {'upload_chunk', 'upload_initiate'}
+
+
+class AdmissionRejected(Exception):
+    """
+    リクエストを受け付けられない場合の例外
+
+    Attributes:
+        retry_after (int): 再試行までの推奨秒数
+        status_code (int): 429（クライアントの上限超過）または 503（サーバー全体の混雑）
+    """
+
+    def __init__(self, message, retry_after, status_code=429):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+def get_config(name):
+    return settings.ADMISSION_CONTROL[name]
+
+
+def get_client_key(request):
+    """
+    レート制限に使うクライアント識別子を返す
+
+    X-API-Key は設定 API_KEYS に登録されたキーのみ識別子として使い、
+    未登録のキー（クライアントが任意に付け替えられる値）はIPアドレス扱いにする。
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key and _is_valid_api_key(api_key):
+        return 'key:' + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return 'ip:' + _get_client_ip(request)
+
+
+def _is_valid_api_key(api_key):
+    return any(hmac.compare_digest(api_key.encode(), valid_key.encode()) for valid_key in get_config('API_KEYS'))
+
+
+def _get_client_ip(request):
+    """
+    クライアントIPアドレスを返す
+
+    X-Forwarded-For の左側はクライアントが自由に書き込めるため、信頼できるプロキシが
+    追記した右側から TRUSTED_PROXY_COUNT 番目のエントリを使う。
+    """
+    ip_address = request.META.get('REMOTE_ADDR', '')
+    trusted_proxy_count = get_config('TRUSTED_PROXY_COUNT')
+    if get_config('TRUST_X_FORWARDED_FOR') and trusted_proxy_count > 0:
+        forwarded_for = [
+            entry.strip() for entry in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if entry.strip()
+        ]
+        if len(forwarded_for) >= trusted_proxy_count:
+            ip_address = forwarded_for[-trusted_proxy_count]
+    return ip_address
+
+
+def estimate_request_cost(request):
+    """
+    リクエストのコストを本文を読む前に見積もる
+
+    cpu_seconds は解析の推定CPU秒（解析リクエストでは実測値との差を後で精算する）、
+    fixed_cpu_seconds は受信バイト数に比例する返却しない課金。
+
+    Returns:
+        dict: {"bytes": int, "cpu_seconds": float, "fixed_cpu_seconds": float, "analysis": bool}
+              制御対象外のリクエストの場合は None
+    """
+    if request.method not in ('POST', 'PUT'):
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+
+    url_name = match.url_name
+    if url_name not in ANALYSIS_URL_NAMES and url_name not in UPLOAD_URL_NAMES:
+        return None
+
+    content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+
+    if url_name == 'upload_finalize':
+        # 本文は小さいので、セッション情報から動画全体のサイズを取得する
+        from .uploads import UploadError, load_upload_session
+        try:
+            video_size = load_upload_session(match.kwargs['upload_id'])['total_size']
+        except UploadError:
+            return None
+        return {
+            "bytes": content_length,
+            "cpu_seconds": get_config('BASE_CPU_SECONDS') + get_config('CPU_SECONDS_PER_MB') * video_size / MB,
+            "fixed_cpu_seconds": get_config('ANALYSIS_FIXED_CPU_SECONDS_PER_MB') * video_size / MB,
+            "analysis": True,
+        }
+
+    if url_name == 'analyze_running_video':
+        return {
+            "bytes": content_length,
+            "cpu_seconds": get_config('BASE_CPU_SECONDS') + get_config('CPU_SECONDS_PER_MB') * content_length / MB,
+            "fixed_cpu_seconds": get_config('ANALYSIS_FIXED_CPU_SECONDS_PER_MB') * content_length / MB,
+            "analysis": True,
+        }
+
+    upload_cpu_seconds = get_config('UPLOAD_CPU_SECONDS_PER_MB') * max(content_length, MB) / MB
+    return {
+        "bytes": content_length,
+        "cpu_seconds": upload_cpu_seconds,
+        "fixed_cpu_seconds": upload_cpu_seconds,
+        "analysis": False,
+    }
+
+
+class AdmissionStore:
+    """
+    アドミッション制御の状態ストアの基底クラス
+
+    サブクラスは _transaction() と状態の読み書きメソッドを実装する。
+    判定ロジックは try_admit() / release() にまとめてある。
+    """
+    _last_pruned_at = 0.0
+
+    @contextmanager
+    def _transaction(self):
+        raise NotImplementedError
+
+    def _get_bucket(self, client_key):
+        """(tokens, updated_at) を返す。未登録なら None"""
+        raise NotImplementedError
+
+    def _set_bucket(self, client_key, tokens, updated_at):
+        raise NotImplementedError
+
+    def _get_inflight_totals(self, now):
+        """期限切れを除いた (件数, 解析件数, バイト数, CPU秒) を返す"""
+        raise NotImplementedError
+
+    def _add_inflight(self, ticket_id, cost, now):
+        raise NotImplementedError
+
+    def _remove_inflight(self, ticket_id):
+        raise NotImplementedError
+
+    def _delete_full_buckets(self, full_before, capacity, refill_rate):
+        """updated_at + (capacity - tokens) / refill_rate（満タンになる時刻）が full_before より前のバケットを削除する"""
+        raise NotImplementedError
+
+    def _prune_buckets(self, now):
+        """
+        満タンになってから capacity / refill_rate 秒以上経ったバケットを削除する
+
+        満タンのバケットは未登録（初回は満タン扱い）と同じなので、削除しても判定は変わらない。
+        """
+        refill_rate = get_config('CLIENT_REFILL_CPU_SECONDS_PER_SECOND')
+        if refill_rate <= 0 or now - self._last_pruned_at < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_pruned_at = now
+        capacity = get_config('CLIENT_BURST_CPU_SECONDS')
+        self._delete_full_buckets(now - capacity / refill_rate, capacity, refill_rate)
+
+    def _refill(self, client_key, now):
+        capacity = get_config('CLIENT_BURST_CPU_SECONDS')
+        bucket = self._get_bucket(client_key)
+        if bucket is None:
+            return capacity
+        tokens, updated_at = bucket
+        refill = max(0.0, now - updated_at) * get_config('CLIENT_REFILL_CPU_SECONDS_PER_SECOND')
+        return min(capacity, tokens + refill)
+
+    @staticmethod
+    def _split_charge(cost):
+        """
+        バケットから引く量を (返却しない分, 精算対象の分) に分ける
+
+        1件のコストがバケット容量を超えると永久に受け付けられないため、合計を容量で頭打ちにする。
+        """
+        capacity = get_config('CLIENT_BURST_CPU_SECONDS')
+        fixed_charge = min(cost["fixed_cpu_seconds"], capacity)
+        refundable_charge = min(cost["cpu_seconds"], capacity - fixed_charge) if cost["analysis"] else 0.0
+        return fixed_charge, refundable_charge
+
+    def try_admit(self, client_key, cost, now=None):
+        """
+        リクエストを受け付けられるか判定し、受け付ける場合は実行中として登録する
+
+        Returns:
+            tuple: (チケットID, 精算対象としてバケットから引いた量)。どちらも release() に渡す
+
+        Raises:
+            AdmissionRejected: クライアント別上限またはサーバー全体の上限を超えた場合
+        """
+        now = now or time.time()
+        fixed_charge, refundable_charge = self._split_charge(cost)
+        charge = fixed_charge + refundable_charge
+        refill_rate = get_config('CLIENT_REFILL_CPU_SECONDS_PER_SECOND')
+
+        with self._transaction():
+            self._prune_buckets(now)
+            tokens = self._refill(client_key, now)
+            if tokens < charge:
+                if refill_rate > 0:
+                    retry_after = min(MAX_RETRY_AFTER_SECONDS, math.ceil((charge - tokens) / refill_rate))
+                else:
+                    retry_after = MAX_RETRY_AFTER_SECONDS
+                raise AdmissionRejected("リクエストが多すぎます。しばらく待ってから再試行してください", retry_after, 429)
+
+            count, analysis_count, inflight_bytes, inflight_cpu = self._get_inflight_totals(now)
+            # 実行中のリクエストがなければ、大きなリクエストでも必ず受け付ける
+            if count > 0:
+                over_limit = (
+                    inflight_bytes + cost["bytes"] > get_config('MAX_INFLIGHT_BYTES')
+                    or inflight_cpu + cost["cpu_seconds"] > get_config('MAX_INFLIGHT_CPU_SECONDS')
+                    or (cost["analysis"] and analysis_count >= get_config('MAX_CONCURRENT_ANALYSES'))
+                )
+                if over_limit:
+                    concurrency = max(1, get_config('MAX_CONCURRENT_ANALYSES'))
+                    retry_after = max(1, min(60, math.ceil(inflight_cpu / concurrency)))
+                    raise AdmissionRejected("サーバーが混雑しています。しばらく待ってから再試行してください", retry_after, 503)
+
+            ticket_id = uuid.uuid4().hex
+            self._set_bucket(client_key, tokens - charge, now)
+            self._add_inflight(ticket_id, cost, now)
+        return ticket_id, refundable_charge
+
+    def release(self, ticket_id, client_key, refundable_charge=0.0, cpu_used=None, now=None):
+        """
+        実行中の登録を解除し、実測CPU時間と精算対象の課金との差をクライアントのバケットに反映する
+
+        返却されるのは try_admit() で実際に引いた精算対象の分までで、受信バイト数分の課金は返さない。
+        cpu_used が None（アップロード等）の場合は精算しない。
+        """
+        now = now or time.time()
+        with self._transaction():
+            self._remove_inflight(ticket_id)
+            if cpu_used is not None:
+                cpu_adjustment = max(0.0, cpu_used) - refundable_charge
+                if cpu_adjustment:
+                    tokens = self._refill(client_key, now)
+                    self._set_bucket(client_key, tokens - cpu_adjustment, now)
+
+
+class MemoryAdmissionStore(AdmissionStore):
+    """
+    プロセス内メモリに状態を保持するストア（単一ワーカー・開発用）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._inflight = {}
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            yield
+
+    def _get_bucket(self, client_key):
+        return self._buckets.get(client_key)
+
+    def _set_bucket(self, client_key, tokens, updated_at):
+        self._buckets[client_key] = (tokens, updated_at)
+
+    def _get_inflight_totals(self, now):
+        ttl = get_config('INFLIGHT_TTL_SECONDS')
+        for ticket_id, (cost, started_at) in list(self._inflight.items()):
+            if now - started_at > ttl:
+                del self._inflight[ticket_id]
+        costs = [cost for cost, _ in self._inflight.values()]
+        return (
+            len(costs),
+            sum(1 for cost in costs if cost["analysis"]),
+            sum(cost["bytes"] for cost in costs),
+            sum(cost["cpu_seconds"] for cost in costs),
+        )
+
+    def _add_inflight(self, ticket_id, cost, now):
+        self._inflight[ticket_id] = (cost, now)
+
+    def _remove_inflight(self, ticket_id):
+        self._inflight.pop(ticket_id, None)
+
+    def _delete_full_buckets(self, full_before, capacity, refill_rate):
+        for client_key, (tokens, updated_at) in list(self._buckets.items()):
+            if updated_at + (capacity - tokens) / refill_rate < full_before:
+                del self._buckets[client_key]
+
+
+class SQLiteAdmissionStore(AdmissionStore):
+    """
+    SQLiteファイルに状態を保持するストア（gunicornの複数ワーカー間で共有）
+
+    ロックを timeout 秒待っても取得できない場合は、判定せずに通すと過負荷を防げないため
+    503（Retry-After 付き）で拒否する。
+    """
+
+    def __init__(self, path, timeout=5):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._transaction() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "client_key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS inflight ("
+                "ticket_id TEXT PRIMARY KEY, bytes INTEGER NOT NULL, cpu_seconds REAL NOT NULL, "
+                "analysis INTEGER NOT NULL, started_at REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        cursor = connection.cursor()
+        # 書き込みロックを先に取り、ワーカー間で判定と登録をアトミックにする
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            raise self._busy_error() from e
+        self._local.cursor = cursor
+        try:
+            yield cursor
+            cursor.execute("COMMIT")
+        except BaseException as e:
+            if connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            if isinstance(e, sqlite3.OperationalError):
+                raise self._busy_error() from e
+            raise
+
+    @staticmethod
+    def _busy_error():
+        return AdmissionRejected(
+            "サーバーが混雑しています。しばらく待ってから再試行してください", STORE_BUSY_RETRY_AFTER_SECONDS, 503
+        )
+
+    def _get_bucket(self, client_key):
+        row = self._local.cursor.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE client_key = ?", (client_key,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _set_bucket(self, client_key, tokens, updated_at):
+        self._local.cursor.execute(
+            "INSERT OR REPLACE INTO buckets (client_key, tokens, updated_at) VALUES (?, ?, ?)",
+            (client_key, tokens, updated_at),
+        )
+
+    def _get_inflight_totals(self, now):
+        cursor = self._local.cursor
+        cursor.execute("DELETE FROM inflight WHERE started_at < ?", (now - get_config('INFLIGHT_TTL_SECONDS'),))
+        row = cursor.execute(
+            "SELECT COUNT(*), COALESCE(SUM(analysis), 0), COALESCE(SUM(bytes), 0), "
+            "COALESCE(SUM(cpu_seconds), 0) FROM inflight"
+        ).fetchone()
+        return tuple(row)
+
+    def _add_inflight(self, ticket_id, cost, now):
+        self._local.cursor.execute(
+            "INSERT INTO inflight (ticket_id, bytes, cpu_seconds, analysis, started_at) VALUES (?, ?, ?, ?, ?)",
+            (ticket_id, cost["bytes"], cost["cpu_seconds"], int(cost["analysis"]), now),
+        )
+
+    def _remove_inflight(self, ticket_id):
+        self._local.cursor.execute("DELETE FROM inflight WHERE ticket_id = ?", (ticket_id,))
+
+    def _delete_full_buckets(self, full_before, capacity, refill_rate):
+        self._local.cursor.execute(
+            "DELETE FROM buckets WHERE updated_at + (? - tokens) / ? < ?",
+            (capacity, refill_rate, full_before),
+        )
+
+
+class AdmissionTicket:
+    """
+    受け付けたリクエストの実行中登録（ミドルウェアがレスポンス返却後に解放する）
+
+    レスポンス返却後もバックグラウンドで解析を続けるビューは defer() で解放を引き継ぎ、
+    解析が終わったら実測CPU秒を渡して release() する。解放されるまでは
+    サーバー全体の同時解析数・実行中CPU秒の上限に数えられる。
+    """
+
+    def __init__(self, store, ticket_id, client_key, refundable_charge):
+        self.store = store
+        self.ticket_id = ticket_id
+        self.client_key = client_key
+        self.refundable_charge = refundable_charge
+        self.deferred = False
+
+    def defer(self):
+        self.deferred = True
+        return self
+
+    def release(self, cpu_used=None):
+        self.store.release(self.ticket_id, self.client_key, self.refundable_charge, cpu_used)
+
+
+def defer_release(request):
+    """
+    リクエストの実行中登録の解放を呼び出し側に引き継ぐ
+
+    Returns:
+        AdmissionTicket: 引き継いだ登録（アドミッション制御の対象外なら None）
+    """
+    ticket = getattr(request, 'admission_ticket', None)
+    return ticket.defer() if ticket is not None else None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_admission_store():
+    """
+    設定（ADMISSION_CONTROL['STORE']）に応じたストアを返す
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if get_config('STORE') == 'sqlite':
+                _store = SQLiteAdmissionStore(get_config('SQLITE_PATH'))
+            else:
+                _store = MemoryAdmissionStore()
+        return _store
@@ -0,0 +1,174 @@
+# 解析結果の保存と履歴の参照
+from django.db import transaction
+from django.db.models import Avg, Count, Prefetch, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from rest_framework.pagination import CursorPagination
+
+from .models import AnalysisResult, Run, WindowMetric
+from .services import summarize_series
+
+# ファイル情報からの推定値は保存・キャッシュ・推移の集計に使わない（実解析が可能になったら解析し直す）
+ESTIMATED_METHODS = [
+    'ultra_safe_analysis',
+    'hardcoded_absolute_fallback',
+    'dummy_analysis_enhanced',
+    'dummy_fallback',
+    'dummy_emergency',
+]
+
+# 解析結果のうち保存しないキー（時系列は大きいため、プロファイルIDは管理者用のため）
+UNSAVED_RESULT_KEYS = ('series', 'series_frames', 'step_frames', 'profile_id')
+
+TREND_PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+class RunCursorPagination(CursorPagination):
+    """
+    ランニング履歴のカーソルページネーション（記録日時の新しい順）
+    """
+    ordering = ('-recorded_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def measured_results():
+    """
+    推定値を除いた（実際に動画を解析した）解析結果のクエリセット
+    """
+    return AnalysisResult.objects.exclude(method__in=ESTIMATED_METHODS)
+
+
+def measured_runs():
+    """
+    実際に解析した結果を持つランニングのクエリセット
+    """
+    return Run.objects.filter(pk__in=measured_results().values('run_id'))
+
+
+def runner_runs(runner_id):
+    """
+    ランナーの履歴一覧用のクエリセット（推定値の解析結果は含めない）
+    """
+    return measured_runs().filter(runner_id=runner_id).prefetch_related(
+        Prefetch('results', queryset=measured_results())
+    )
+
+
+def get_run(run_id):
+    """
+    ランニング1件を区間指標付きで返す（推定値の解析結果は含めない、なければ None）
+    """
+    return measured_runs().prefetch_related(
+        Prefetch('results', queryset=measured_results().prefetch_related('windows'))
+    ).filter(pk=run_id).first()
+
+
+def save_analysis_result(analysis_result, content_hash, runner_id='', filename='',
+                         file_size=0, recorded_at=None, windows=None):
+    """
+    解析結果を保存する（区間指標は bulk_create で一括登録）
+
+    Args:
+        analysis_result (dict): 解析結果
+        content_hash (str): 動画のSHA-256
+        runner_id (str): ランナーID（任意）
+        windows (list): 区間指標（省略時は解析結果の時系列から計算する）
+
+    Returns:
+        AnalysisResult: 保存した解析結果（推定値の場合は保存せず None）
+    """
+    if analysis_result.get("method") in ESTIMATED_METHODS:
+        return None
+
+    summary = summarize_series(analysis_result)
+    if windows is None:
+        windows = summary["windows"]
+
+    # 時系列はサマリーと区間指標のみ保存する
+    raw = {key: value for key, value in analysis_result.items() if key not in UNSAVED_RESULT_KEYS}
+    if summary["duration_sec"] is not None:
+        raw.setdefault("cadence", summary["cadence"])
+        raw.setdefault("duration_sec", summary["duration_sec"])
+
+    with transaction.atomic():
+        run_defaults = {"filename": filename, "file_size": file_size}
+        if recorded_at is not None:
+            run_defaults["recorded_at"] = recorded_at
+        run, _ = Run.objects.get_or_create(runner_id=runner_id, content_hash=content_hash, defaults=run_defaults)
+
+        result = AnalysisResult.objects.create(
+            run=run,
+            method=analysis_result.get("method", "unknown"),
+            step_count=analysis_result.get("step_count", 0),
+            average_lean_angle=analysis_result.get("average_lean_angle", 0.0),
+            cadence=raw.get("cadence"),
+            duration_sec=raw.get("duration_sec"),
+            raw=raw,
+        )
+        WindowMetric.objects.bulk_create([
+            WindowMetric(result=result, **window) for window in windows
+        ])
+    return result
+
+
+def reuse_cached_result(content_hash, runner_id='', filename='', file_size=0, recorded_at=None, method=None):
+    """
+    同じ動画の解析結果が保存済みなら、再解析せずにそれを返す
+
+    別のランナーIDで同じ動画がアップロードされた場合は、そのランナーの履歴にも登録する。
+    method を指定した場合は、その解析方法（姿勢推定バックエンド）の結果のみを再利用する。
+
+    Returns:
+        dict: 保存済みの解析結果（キャッシュがなければ None）
+    """
+    cached_results = measured_results().filter(run__content_hash=content_hash)
+    if method:
+        cached_results = cached_results.filter(method=method)
+    cached = cached_results.prefetch_related('windows').order_by('-created_at', '-id').first()
+    if cached is None:
+        return None
+
+    if not Run.objects.filter(runner_id=runner_id, content_hash=content_hash).exists():
+        windows = [
+            {
+                "window_index": window.window_index,
+                "start_sec": window.start_sec,
+                "end_sec": window.end_sec,
+                "cadence": window.cadence,
+                "average_lean_angle": window.average_lean_angle,
+            }
+            for window in cached.windows.all()
+        ]
+        save_analysis_result(cached.raw, content_hash, runner_id, filename, file_size, recorded_at, windows)
+
+    # 他のランナーにも返すため、以前に保存されたプロファイルIDは除く
+    result = {key: value for key, value in cached.raw.items() if key not in UNSAVED_RESULT_KEYS}
+    return {**result, "cached": True}
+
+
+def runner_trends(runner_id, period='week'):
+    """
+    ランナーのピッチ・前傾角度の推移を期間ごとに集計する
+
+    Returns:
+        list: [{"period", "run_count", "average_cadence", "average_lean_angle", "total_steps"}, ...]
+    """
+    trunc = TREND_PERIODS[period]
+    return list(
+        measured_results()
+        .filter(run__runner_id=runner_id)
+        .annotate(period=trunc('run__recorded_at'))
+        .values('period')
+        .annotate(
+            run_count=Count('run', distinct=True),
+            average_cadence=Avg('cadence'),
+            average_lean_angle=Avg('average_lean_angle'),
+            total_steps=Sum('step_count'),
+        )
+        .order_by('period')
+    )
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.pose_backends import available_pose_backends, get_pose_backend
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+
+
+class Command(BaseCommand):
+    help = '同じ動画で姿勢推定バックエンドごとの処理速度（frames/sec）と検出率を比較する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_path', help='ベンチマークに使用する動画ファイル')
+        parser.add_argument('--backends', nargs='+', help='比較するバックエンド（省略時は使用可能なすべて）')
+        parser.add_argument('--max-frames', type=int, default=300, help='使用する最大フレーム数')
+        parser.add_argument('--warmup', type=int, default=5, help='計測前に捨てるフレーム数')
+
+    def handle(self, *args, **options):
+        if not OPENCV_AVAILABLE:
+            raise CommandError("OpenCV is not available. Please install opencv-python")
+
+        backends = options['backends'] or available_pose_backends()
+        if not backends:
+            raise CommandError("使用可能な姿勢推定バックエンドがありません")
+
+        # デコード時間を含めないよう、先にフレームをメモリへ読み込む
+        frames = self._read_frames(options['video_path'], options['max_frames'])
+        if not frames:
+            raise CommandError("動画からフレームを読み込めませんでした")
+        self.stdout.write(f"動画: {options['video_path']}（{len(frames)} フレーム, "
+                          f"{frames[0].shape[1]}x{frames[0].shape[0]}）")
+
+        for name in backends:
+            try:
+                with get_pose_backend(name) as backend:
+                    backend.process_batch(frames[:options['warmup']])
+
+                    start_time = time.perf_counter()
+                    detections = 0
+                    for start in range(0, len(frames), backend.batch_size):
+                        keypoints_list = backend.process_batch(frames[start:start + backend.batch_size])
+                        detections += sum(1 for keypoints in keypoints_list if keypoints is not None)
+                    elapsed = time.perf_counter() - start_time
+            except Exception as e:
+                self.stderr.write(f"{name:<16} エラー: {str(e)}")
+                continue
+
+            self.stdout.write(
+                f"{name:<16} {len(frames) / elapsed:8.1f} frames/sec  "
+                f"{elapsed / len(frames) * 1000:7.1f} ms/frame  "
+                f"検出率 {detections / len(frames) * 100:5.1f}%  (batch={backend.batch_size})"
+            )
+
+    def _read_frames(self, video_path, max_frames):
+        cap = cv2.VideoCapture(video_path)
+        frames = []
+        try:
+            while len(frames) < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(frame)
+        finally:
+            cap.release()
+        return frames
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import urllib.request
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# ダウンロードのブロックサイズ（モデル全体をメモリに載せない）
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(DOWNLOAD_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = 'ONNX姿勢推定モデルを固定URLからダウンロードし、SHA-256を検証して POSE_ONNX_MODEL_PATH に配置する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='モデルのURL（省略時は POSE_ONNX_MODEL_URL）')
+        parser.add_argument('--sha256', help='モデルのSHA-256（省略時は POSE_ONNX_MODEL_SHA256）')
+        parser.add_argument('--skip-if-unconfigured', action='store_true',
+                            help='URL・SHA-256が未設定なら何もせず終了する（ビルド用）')
+
+    def handle(self, *args, **options):
+        url = options['url'] or settings.POSE_ONNX_MODEL_URL
+        expected_sha256 = (options['sha256'] or settings.POSE_ONNX_MODEL_SHA256).strip().lower()
+        model_path = str(settings.POSE_ONNX_MODEL_PATH)
+
+        if not url or not expected_sha256:
+            if options['skip_if_unconfigured']:
+                self.stdout.write("POSE_ONNX_MODEL_URL / POSE_ONNX_MODEL_SHA256 が未設定のため、モデルの取得を省略します")
+                return
+            raise CommandError("POSE_ONNX_MODEL_URL と POSE_ONNX_MODEL_SHA256 を設定してください")
+
+        # ビルドキャッシュ等で検証済みのモデルがあればダウンロードしない
+        if os.path.exists(model_path) and file_sha256(model_path) == expected_sha256:
+            self.stdout.write(f"モデルは取得済みです: {model_path}")
+            return
+
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        temp_path = f"{model_path}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        try:
+            self.stdout.write(f"モデルをダウンロード中: {url}")
+            with urllib.request.urlopen(url, timeout=60) as response, open(temp_path, 'wb') as f:
+                for block in iter(lambda: response.read(DOWNLOAD_BLOCK_SIZE), b''):
+                    digest.update(block)
+                    f.write(block)
+
+            actual_sha256 = digest.hexdigest()
+            if actual_sha256 != expected_sha256:
+                raise CommandError(f"モデルのチェックサムが一致しません（期待値 {expected_sha256}, 実際 {actual_sha256}）")
+
+            # 検証済みのモデルのみをアトミックに配置する
+            os.replace(temp_path, model_path)
+        except OSError as e:
+            raise CommandError(f"モデルのダウンロードに失敗しました: {str(e)}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.stdout.write(self.style.SUCCESS(f"モデルを配置しました: {model_path}（sha256={expected_sha256}）"))
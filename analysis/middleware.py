@@ -0,0 +1,106 @@
+# analysis アプリのミドルウェア
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from . import admission
+
+logger = logging.getLogger(__name__)
+
+# Brotliの利用可能性チェック（なければgzipのみ）
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+re_accepts_brotli = re.compile(r"\bbr\b")
+
+# これより小さいレスポンスは圧縮しても効果が薄い
+MIN_COMPRESS_LENGTH = 200
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Accept-Encoding に応じてレスポンスを Brotli または gzip で圧縮する
+
+    brotli パッケージがない環境では Django 標準の GZipMiddleware と同じ動作になる。
+    """
+
+    def process_response(self, request, response):
+        if (
+            not BROTLI_AVAILABLE
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < MIN_COMPRESS_LENGTH
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content, quality=5)
+        if len(compressed_content) >= len(response.content):
+            return response
+
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+        # 圧縮後は内容がバイト単位で変わるため強いETagを弱いETagにする
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+class AdmissionControlMiddleware:
+    """
+    解析・アップロード系リクエストのアドミッション制御
+
+    リクエスト本文を読む前に Content-Length からコストを見積もり、
+    クライアント別トークンバケットとサーバー全体の実行中上限を超える場合は
+    429 / 503 と Retry-After を返して早期に拒否する。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.ADMISSION_CONTROL['ENABLED']:
+            return self.get_response(request)
+
+        cost = admission.estimate_request_cost(request)
+        if cost is None:
+            return self.get_response(request)
+
+        if 'CONTENT_LENGTH' not in request.META and request.META.get('HTTP_TRANSFER_ENCODING'):
+            return JsonResponse({"error": "Content-Length ヘッダーが必要です"}, status=411)
+
+        store = admission.get_admission_store()
+        client_key = admission.get_client_key(request)
+        try:
+            ticket_id, refundable_charge = store.try_admit(client_key, cost)
+        except admission.AdmissionRejected as e:
+            logger.warning(f"アドミッション拒否: {client_key}, {request.path}, "
+                           f"{cost['bytes']} bytes, 推定{cost['cpu_seconds']:.1f}CPU秒, {str(e)}")
+            response = JsonResponse({"error": str(e), "retry_after": e.retry_after}, status=e.status_code)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+
+        ticket = admission.AdmissionTicket(store, ticket_id, client_key, refundable_charge)
+        request.admission_ticket = ticket
+        cpu_start = time.process_time()
+        try:
+            return self.get_response(request)
+        finally:
+            cpu_used = time.process_time() - cpu_start
+            # バックグラウンドで解析を続けるビューは解放を引き継いでいる
+            if not ticket.deferred:
+                try:
+                    ticket.release(cpu_used if cost["analysis"] else None)
+                except Exception as e:
+                    logger.error(f"アドミッション状態の解放でエラー: {str(e)}")
@@ -0,0 +1,83 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Run',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('runner_id', models.CharField(blank=True, default='', max_length=64, verbose_name='ランナーID')),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='記録日時')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='動画のSHA-256')),
+                ('filename', models.CharField(blank=True, default='', max_length=255, verbose_name='ファイル名')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='ファイルサイズ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'ランニング',
+                'verbose_name_plural': 'ランニング',
+                'ordering': ['-recorded_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnalysisResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=64, verbose_name='解析方法')),
+                ('step_count', models.IntegerField(verbose_name='歩数')),
+                ('average_lean_angle', models.FloatField(verbose_name='平均前傾角度')),
+                ('cadence', models.FloatField(blank=True, null=True, verbose_name='ピッチ（歩/分）')),
+                ('duration_sec', models.FloatField(blank=True, null=True, verbose_name='解析時間（秒）')),
+                ('raw', models.JSONField(default=dict, verbose_name='レスポンス')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='analysis.run')),
+            ],
+            options={
+                'verbose_name': '解析結果',
+                'verbose_name_plural': '解析結果',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WindowMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_index', models.PositiveIntegerField(verbose_name='区間番号')),
+                ('start_sec', models.FloatField(verbose_name='開始（秒）')),
+                ('end_sec', models.FloatField(verbose_name='終了（秒）')),
+                ('cadence', models.FloatField(blank=True, null=True, verbose_name='ピッチ（歩/分）')),
+                ('average_lean_angle', models.FloatField(blank=True, null=True, verbose_name='平均前傾角度')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='windows', to='analysis.analysisresult')),
+            ],
+            options={
+                'verbose_name': '区間指標',
+                'verbose_name_plural': '区間指標',
+                'ordering': ['result', 'window_index'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['runner_id', '-recorded_at'], name='run_runner_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['content_hash'], name='run_content_hash_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='run',
+            constraint=models.UniqueConstraint(fields=('runner_id', 'content_hash'), name='run_runner_content_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='windowmetric',
+            constraint=models.UniqueConstraint(fields=('result', 'window_index'), name='window_result_index_unique'),
+        ),
+    ]
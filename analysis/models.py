@@ -0,0 +1,71 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Run(models.Model):
+    """
+    ランナーの1回分のランニング（アップロードされた1本の動画）
+    """
+    runner_id = models.CharField('ランナーID', max_length=64, blank=True, default='')
+    recorded_at = models.DateTimeField('記録日時', default=timezone.now)
+    content_hash = models.CharField('動画のSHA-256', max_length=64)
+    filename = models.CharField('ファイル名', max_length=255, blank=True, default='')
+    file_size = models.BigIntegerField('ファイルサイズ', default=0)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'ランニング'
+        verbose_name_plural = 'ランニング'
+        ordering = ['-recorded_at', '-id']
+        indexes = [
+            models.Index(fields=['runner_id', '-recorded_at'], name='run_runner_recorded_idx'),
+            models.Index(fields=['content_hash'], name='run_content_hash_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['runner_id', 'content_hash'], name='run_runner_content_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.runner_id or '匿名'} {self.recorded_at:%Y-%m-%d %H:%M} ({self.filename})"
+
+
+class AnalysisResult(models.Model):
+    """
+    ランニング動画の解析結果（時系列を除いたサマリー）
+    """
+    run = models.ForeignKey(Run, on_delete=models.CASCADE, related_name='results')
+    method = models.CharField('解析方法', max_length=64)
+    step_count = models.IntegerField('歩数')
+    average_lean_angle = models.FloatField('平均前傾角度')
+    cadence = models.FloatField('ピッチ（歩/分）', null=True, blank=True)
+    duration_sec = models.FloatField('解析時間（秒）', null=True, blank=True)
+    raw = models.JSONField('レスポンス', default=dict)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+
+    class Meta:
+        verbose_name = '解析結果'
+        verbose_name_plural = '解析結果'
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"{self.run} - {self.method}"
+
+
+class WindowMetric(models.Model):
+    """
+    解析結果を一定区間ごとに分けた指標
+    """
+    result = models.ForeignKey(AnalysisResult, on_delete=models.CASCADE, related_name='windows')
+    window_index = models.PositiveIntegerField('区間番号')
+    start_sec = models.FloatField('開始（秒）')
+    end_sec = models.FloatField('終了（秒）')
+    cadence = models.FloatField('ピッチ（歩/分）', null=True, blank=True)
+    average_lean_angle = models.FloatField('平均前傾角度', null=True, blank=True)
+
+    class Meta:
+        verbose_name = '区間指標'
+        verbose_name_plural = '区間指標'
+        ordering = ['result', 'window_index']
+        constraints = [
+            models.UniqueConstraint(fields=['result', 'window_index'], name='window_result_index_unique'),
+        ]
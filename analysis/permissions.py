@@ -0,0 +1,16 @@
+from rest_framework.permissions import BasePermission
+
+from .profiling import has_profiling_token
+
+
+class IsProfilingAdmin(BasePermission):
+    """
+    スタッフユーザー、または X-Profile-Token ヘッダーが一致するリクエストのみ許可する
+    """
+    message = "プロファイルの参照には管理者権限が必要です"
+
+    def has_permission(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        return has_profiling_token(request)
@@ -0,0 +1,256 @@
+# 姿勢推定バックエンド（MediaPipe / ONNX Runtime）の共通インターフェース
+import os
+
+from django.conf import settings
+
+# OpenCV/NumPyの利用可能性チェック
+try:
+    import cv2
+    import numpy as np
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+
+# MediaPipeの利用可能性チェック
+try:
+    import mediapipe as mp
+    MEDIAPIPE_AVAILABLE = True
+except ImportError:
+    MEDIAPIPE_AVAILABLE = False
+
+# ONNX Runtimeの利用可能性チェック
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+# 解析に使用するランドマーク（正規化座標 (x, y)、画像の左上が原点）
+KEYPOINT_NAMES = ('left_shoulder', 'right_shoulder', 'left_hip', 'right_hip')
+
+
+class PoseBackend:
+    """
+    姿勢推定バックエンドの基底クラス
+
+    process_batch() はBGRフレームのリストを受け取り、フレームごとに
+    {ランドマーク名: (x, y)} の辞書（検出できなければ None）を返す。
+    """
+    name = ''
+    batch_size = 1
+
+    def process_batch(self, frames):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MediaPipePoseBackend(PoseBackend):
+    """
+    MediaPipe Pose（lite / full / heavy）
+
+    フレーム間のトラッキングを使うため、バッチ内も1フレームずつ順番に処理する。
+    """
+    MODEL_COMPLEXITY = {'lite': 0, 'full': 1, 'heavy': 2}
+
+    def __init__(self, variant='full'):
+        if not MEDIAPIPE_AVAILABLE:
+            raise ImportError("MediaPipe is not available. Please install mediapipe: pip install mediapipe")
+        self.name = f"mediapipe-{variant}"
+        self._mp_pose = mp.solutions.pose
+        self._pose = self._mp_pose.Pose(
+            static_image_mode=False,
+            model_complexity=self.MODEL_COMPLEXITY[variant],
+            enable_segmentation=False,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+        landmark = self._mp_pose.PoseLandmark
+        self._landmark_indices = {
+            'left_shoulder': landmark.LEFT_SHOULDER.value,
+            'right_shoulder': landmark.RIGHT_SHOULDER.value,
+            'left_hip': landmark.LEFT_HIP.value,
+            'right_hip': landmark.RIGHT_HIP.value,
+        }
+
+    def process_batch(self, frames):
+        keypoints_list = []
+        for frame in frames:
+            # フレームをRGBに変換（MediaPipeはRGBを期待）
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            results = self._pose.process(rgb_frame)
+            if not results.pose_landmarks:
+                keypoints_list.append(None)
+                continue
+            landmarks = results.pose_landmarks.landmark
+            keypoints_list.append({
+                name: (landmarks[index].x, landmarks[index].y)
+                for name, index in self._landmark_indices.items()
+            })
+        return keypoints_list
+
+    def close(self):
+        self._pose.close()
+
+
+class OnnxPoseBackend(PoseBackend):
+    """
+    ONNX Runtime（CPU）で MoveNet 形式の単一人物姿勢推定モデルを実行する
+
+    入力は [N, H, W, 3]（RGB）、出力は [N, 1, 17, 3]（y, x, score、COCO順）を想定する。
+    バッチ次元が可変のモデルでは複数フレームを1回の推論でまとめて処理する。
+    """
+    name = 'onnx'
+
+    # COCOキーポイントのインデックス
+    KEYPOINT_INDICES = {
+        'left_shoulder': 5,
+        'right_shoulder': 6,
+        'left_hip': 11,
+        'right_hip': 12,
+    }
+    INPUT_DTYPES = {
+        'tensor(int32)': 'int32',
+        'tensor(uint8)': 'uint8',
+        'tensor(float)': 'float32',
+    }
+
+    def __init__(self, model_path=None, batch_size=None, num_threads=None):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("ONNX Runtime is not available. Please install onnxruntime")
+        if not OPENCV_AVAILABLE:
+            raise ImportError("OpenCV is not available. Please install opencv-python")
+
+        model_path = str(model_path or settings.POSE_ONNX_MODEL_PATH)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNXモデルが見つかりません: {model_path}")
+
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = num_threads or settings.POSE_ONNX_NUM_THREADS
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(
+            model_path, sess_options=session_options, providers=['CPUExecutionProvider']
+        )
+
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self._input_dtype = self.INPUT_DTYPES.get(model_input.type, 'float32')
+        batch_dim, input_height, input_width = model_input.shape[:3]
+        # 入力サイズが可変のモデルは MoveNet Lightning の既定サイズを使う
+        self._input_height = input_height if isinstance(input_height, int) else 192
+        self._input_width = input_width if isinstance(input_width, int) else 192
+        # バッチ次元が固定のモデルはそのサイズで推論する（端数はゼロ埋め）
+        self._fixed_batch = isinstance(batch_dim, int)
+        self.batch_size = batch_dim if self._fixed_batch else (batch_size or settings.POSE_ONNX_BATCH_SIZE)
+        self._min_score = settings.POSE_MIN_KEYPOINT_SCORE
+
+    def _preprocess(self, frame):
+        """
+        正方形にパディングしてからモデル入力サイズに縮小する（縦横比を保つ）
+        """
+        height, width = frame.shape[:2]
+        side = max(height, width)
+        pad_y, pad_x = (side - height) // 2, (side - width) // 2
+        padded = cv2.copyMakeBorder(frame, pad_y, side - height - pad_y, pad_x, side - width - pad_x,
+                                    cv2.BORDER_CONSTANT, value=0)
+        resized = cv2.resize(padded, (self._input_width, self._input_height), interpolation=cv2.INTER_AREA)
+        rgb_frame = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        return rgb_frame, (side, pad_x, pad_y, width, height)
+
+    def process_batch(self, frames):
+        keypoints_list = []
+        for start in range(0, len(frames), self.batch_size):
+            batch = [self._preprocess(frame) for frame in frames[start:start + self.batch_size]]
+            inputs = np.stack([image for image, _ in batch]).astype(self._input_dtype)
+            if self._fixed_batch and len(batch) < self.batch_size:
+                padding = np.zeros((self.batch_size - len(batch),) + inputs.shape[1:], dtype=inputs.dtype)
+                inputs = np.concatenate([inputs, padding])
+            outputs = self._session.run(None, {self._input_name: inputs})[0]
+            outputs = outputs.reshape(inputs.shape[0], -1, 3)[:len(batch)]
+
+            for keypoints, (_, (side, pad_x, pad_y, width, height)) in zip(outputs, batch):
+                selected = {name: keypoints[index] for name, index in self.KEYPOINT_INDICES.items()}
+                if min(float(score) for _, _, score in selected.values()) < self._min_score:
+                    keypoints_list.append(None)
+                    continue
+                # パディング込みの正規化座標を元フレームの正規化座標に戻す
+                keypoints_list.append({
+                    name: ((float(x) * side - pad_x) / width, (float(y) * side - pad_y) / height)
+                    for name, (y, x, _) in selected.items()
+                })
+        return keypoints_list
+
+
+# バックエンド名 → 生成関数
+POSE_BACKENDS = {
+    'mediapipe-lite': lambda: MediaPipePoseBackend('lite'),
+    'mediapipe-full': lambda: MediaPipePoseBackend('full'),
+    'mediapipe-heavy': lambda: MediaPipePoseBackend('heavy'),
+    'onnx': lambda: OnnxPoseBackend(),
+}
+
+# 'auto' 指定時に試す順番
+AUTO_BACKEND_ORDER = ['mediapipe-full', 'onnx']
+
+
+def available_pose_backends():
+    """
+    この環境で使用可能なバックエンド名のリストを返す
+    """
+    available = []
+    if MEDIAPIPE_AVAILABLE and OPENCV_AVAILABLE:
+        available += ['mediapipe-lite', 'mediapipe-full', 'mediapipe-heavy']
+    if ONNXRUNTIME_AVAILABLE and OPENCV_AVAILABLE and os.path.exists(str(settings.POSE_ONNX_MODEL_PATH)):
+        available.append('onnx')
+    return available
+
+
+def resolve_pose_backend_name(name=None, require_available=False):
+    """
+    バックエンド名を解決する（None / 'auto' は設定値または使用可能な最初のもの）
+
+    Args:
+        name (str): バックエンド名（省略時は設定 POSE_BACKEND）
+        require_available (bool): 'auto' 以外の名前が使用不可の場合に None ではなく ValueError にする
+
+    Returns:
+        str: バックエンド名（使用可能なものがなければ None）
+
+    Raises:
+        ValueError: 未知のバックエンド名、または require_available で使用不可のバックエンドが指定された場合
+    """
+    name = name or settings.POSE_BACKEND
+    if name != 'auto' and name not in POSE_BACKENDS:
+        raise ValueError(f"未知の姿勢推定バックエンドです: {name}（{', '.join(POSE_BACKENDS)}）")
+
+    available = available_pose_backends()
+    if name != 'auto':
+        if name in available:
+            return name
+        if require_available:
+            raise ValueError(f"姿勢推定バックエンドがこの環境では使用できません: {name}")
+        return None
+    for candidate in AUTO_BACKEND_ORDER:
+        if candidate in available:
+            return candidate
+    return None
+
+
+def get_pose_backend(name=None):
+    """
+    姿勢推定バックエンドを生成する（使い終わったら close() すること）
+
+    Raises:
+        ImportError: 使用可能なバックエンドがない場合
+    """
+    resolved = resolve_pose_backend_name(name)
+    if resolved is None:
+        raise ImportError(f"姿勢推定バックエンドが使用できません: {name or settings.POSE_BACKEND}")
+    return POSE_BACKENDS[resolved]()
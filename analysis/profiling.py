@@ -0,0 +1,247 @@
+# 解析処理のサンプリングプロファイラ（リクエスト単位で有効化）
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+PROFILE_ID_LENGTH = 32
+FOLDED_EXTENSION = '.folded'
+METADATA_EXTENSION = '.json'
+
+
+class SamplingProfiler:
+    """
+    対象スレッドのコールスタックを一定間隔で記録する低オーバーヘッドのプロファイラ
+
+    別スレッドから sys._current_frames() を読むだけなので、解析処理側には
+    トレースフックを仕掛けない。結果は flamegraph.pl / speedscope で読める
+    folded 形式（"root;caller;callee 回数"）で出力する。
+    関数名に行番号を含めるため、同じ関数内の cap.read / cvtColor / pose.process
+    などの呼び出し箇所を区別できる。
+    """
+
+    def __init__(self, interval=None, thread_id=None):
+        self.interval = interval or settings.PROFILING_INTERVAL_SECONDS
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='analysis-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.time() - self.started_at
+        return self
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples[self._fold_stack(frame)] += 1
+            self.sample_count += 1
+
+    @staticmethod
+    def _fold_stack(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+            stack.append(label.replace(';', ':'))
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def folded(self):
+        """
+        folded 形式のテキストを返す
+        """
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def top_functions(self, limit=20):
+        """
+        サンプルの末端（実行中だった箇所）を多い順に返す
+        """
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = max(self.sample_count, 1)
+        return [
+            {"function": function, "samples": count, "percent": round(count / total * 100, 1)}
+            for function, count in leaves.most_common(limit)
+        ]
+
+
+def has_profiling_token(request):
+    """
+    X-Profile-Token ヘッダーが設定 PROFILING_TOKEN と一致するか
+    """
+    token = settings.PROFILING_TOKEN
+    provided = request.headers.get('X-Profile-Token', '')
+    return bool(token) and hmac.compare_digest(provided.encode(), token.encode())
+
+
+def should_profile(request):
+    """
+    このリクエストをプロファイルするか判定する
+
+    - 管理者（X-Profile-Token ヘッダー、またはスタッフユーザー + ?profile=1）の明示指定
+    - PROFILING_SAMPLE_RATE の確率でのサンプリング
+    """
+    if has_profiling_token(request):
+        return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff and request.query_params.get('profile') == '1':
+        return True
+    sample_rate = settings.PROFILING_SAMPLE_RATE
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+class RequestProfile:
+    """
+    解析処理をプロファイルするコンテキストマネージャー（対象外のリクエストでは何もしない）
+
+    使用例:
+        with RequestProfile(request, {"filename": filename}) as profile:
+            result = run_video_analysis(path)
+            profile.add_metadata(method=result.get("method"))
+        profile.profile_id  # 保存したプロファイルのID（対象外なら None）
+    """
+
+    def __init__(self, request, metadata=None):
+        self.enabled = should_profile(request)
+        self.metadata = dict(metadata or {})
+        self.metadata["path"] = request.path
+        self.profile_id = None
+        self._profiler = None
+
+    def add_metadata(self, **metadata):
+        self.metadata.update(metadata)
+
+    def __enter__(self):
+        if self.enabled:
+            self._profiler = SamplingProfiler().start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profiler is None:
+            return False
+        self._profiler.stop()
+        if exc_type is not None:
+            self.metadata["error"] = str(exc_value)[:200]
+        try:
+            self.profile_id = save_profile(self._profiler, self.metadata)
+        except Exception as e:
+            print(f"プロファイルの保存でエラー: {str(e)}")
+        return False
+
+
+def get_profile_root():
+    """
+    プロファイルを保存するディレクトリを返す（管理者用APIからのみ参照させるため MEDIA_ROOT の外）
+    """
+    profile_root = str(settings.PROFILING_DIR)
+    os.makedirs(profile_root, exist_ok=True)
+    return profile_root
+
+
+def _profile_path(profile_id, extension):
+    profile_id = uuid.UUID(str(profile_id)).hex
+    return os.path.join(get_profile_root(), profile_id + extension)
+
+
+def save_profile(profiler, metadata):
+    """
+    プロファイル（folded 形式）とメタデータを保存する
+
+    Returns:
+        str: プロファイルID
+    """
+    # URLの <uuid:profile_id> はハイフン付きの形式のみ受け付ける
+    profile_id = str(uuid.uuid4())
+    with open(_profile_path(profile_id, FOLDED_EXTENSION), 'w') as f:
+        f.write(profiler.folded())
+
+    profile_metadata = {
+        "profile_id": profile_id,
+        "created_at": profiler.started_at,
+        "duration_sec": round(profiler.duration, 3),
+        "interval_sec": profiler.interval,
+        "sample_count": profiler.sample_count,
+        "top_functions": profiler.top_functions(),
+        "metadata": metadata,
+    }
+    with open(_profile_path(profile_id, METADATA_EXTENSION), 'w') as f:
+        json.dump(profile_metadata, f, ensure_ascii=False, default=str)
+
+    purge_old_profiles()
+    return profile_id
+
+
+def list_profiles():
+    """
+    保存済みプロファイルのメタデータを新しい順に返す（top_functions は除く）
+    """
+    profiles = []
+    profile_root = get_profile_root()
+    for name in os.listdir(profile_root):
+        if not name.endswith(METADATA_EXTENSION):
+            continue
+        try:
+            with open(os.path.join(profile_root, name)) as f:
+                profile_metadata = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        profile_metadata.pop("top_functions", None)
+        profiles.append(profile_metadata)
+    profiles.sort(key=lambda profile: profile.get("created_at") or 0, reverse=True)
+    return profiles
+
+
+def load_profile_metadata(profile_id):
+    """
+    プロファイルのメタデータを返す（存在しなければ None）
+    """
+    try:
+        with open(_profile_path(profile_id, METADATA_EXTENSION)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def folded_profile_path(profile_id):
+    """
+    folded 形式のプロファイルのパスを返す（存在しなければ None）
+    """
+    path = _profile_path(profile_id, FOLDED_EXTENSION)
+    return path if os.path.exists(path) else None
+
+
+def purge_old_profiles(max_profiles=None):
+    """
+    保存数の上限を超えた古いプロファイルを削除する
+    """
+    max_profiles = max_profiles if max_profiles is not None else settings.PROFILING_MAX_PROFILES
+    profiles = list_profiles()
+    for profile_metadata in profiles[max_profiles:]:
+        for extension in (FOLDED_EXTENSION, METADATA_EXTENSION):
+            try:
+                os.remove(_profile_path(profile_metadata["profile_id"], extension))
+            except OSError:
+                continue
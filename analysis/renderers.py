@@ -0,0 +1,100 @@
+# 時系列データをコンパクトに返すためのレンダラー
+import base64
+import math
+import sys
+from array import array
+
+from rest_framework.renderers import JSONRenderer
+
+COMPACT_SERIES_ENCODING = 'f32-delta-base64'
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 10000
+
+
+def downsample_series(values, max_points):
+    """
+    時系列をバケット平均で max_points 点以下に間引く
+
+    Returns:
+        tuple: (間引き後のリスト, 1点あたりの元サンプル数)
+    """
+    length = len(values)
+    if max_points <= 0 or length <= max_points:
+        return list(values), 1.0
+
+    bucket_size = length / max_points
+    downsampled = []
+    for i in range(max_points):
+        start = int(i * bucket_size)
+        end = max(start + 1, int((i + 1) * bucket_size))
+        bucket = values[start:end]
+        downsampled.append(sum(bucket) / len(bucket))
+    return downsampled, bucket_size
+
+
+def encode_series(values, max_points=DEFAULT_MAX_POINTS):
+    """
+    時系列を float32 の差分列として base64 エンコードする
+
+    差分は float32 で復元した値との差から求めるため、クライアント側で
+    累積和を取っても丸め誤差が蓄積しない。
+
+    Returns:
+        dict: {"encoding", "length", "count", "step", "data"}
+    """
+    downsampled, step = downsample_series(values, max_points)
+
+    deltas = array('f')
+    reconstructed = 0.0
+    for value in downsampled:
+        value = float(value)
+        if not math.isfinite(value):
+            value = reconstructed
+        deltas.append(value - reconstructed)
+        reconstructed += deltas[-1]
+
+    # ブラウザ側の Float32Array に合わせてリトルエンディアンで送る
+    if sys.byteorder != 'little':
+        deltas.byteswap()
+
+    return {
+        "encoding": COMPACT_SERIES_ENCODING,
+        "length": len(values),
+        "count": len(downsampled),
+        "step": round(step, 6),
+        "data": base64.b64encode(deltas.tobytes()).decode('ascii'),
+    }
+
+
+class CompactSeriesRenderer(JSONRenderer):
+    """
+    "series" 内の時系列を float32 差分 + base64 に変換して返すJSONレンダラー
+
+    Accept: application/vnd.running-analysis.compact+json または
+    ?format=compact で選択する。?max_points= で表示用の間引き点数を指定できる。
+    """
+    media_type = 'application/vnd.running-analysis.compact+json'
+    format = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and isinstance(data.get('series'), dict):
+            max_points = self._get_max_points(renderer_context or {})
+            data = {
+                **data,
+                "series": {
+                    name: encode_series(values, max_points)
+                    for name, values in data['series'].items()
+                },
+                "series_encoding": COMPACT_SERIES_ENCODING,
+            }
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def _get_max_points(self, renderer_context):
+        request = renderer_context.get('request')
+        if request is None:
+            return DEFAULT_MAX_POINTS
+        try:
+            max_points = int(request.query_params.get('max_points', DEFAULT_MAX_POINTS))
+        except (TypeError, ValueError):
+            return DEFAULT_MAX_POINTS
+        return max(0, min(max_points, MAX_POINTS_LIMIT))
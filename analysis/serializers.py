@@ -0,0 +1,34 @@
+from rest_framework import serializers
+
+from .models import AnalysisResult, Run, WindowMetric
+
+
+class WindowMetricSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WindowMetric
+        fields = ['window_index', 'start_sec', 'end_sec', 'cadence', 'average_lean_angle']
+
+
+class AnalysisResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AnalysisResult
+        fields = ['id', 'method', 'step_count', 'average_lean_angle', 'cadence', 'duration_sec', 'created_at']
+
+
+class AnalysisResultDetailSerializer(AnalysisResultSerializer):
+    windows = WindowMetricSerializer(many=True, read_only=True)
+
+    class Meta(AnalysisResultSerializer.Meta):
+        fields = AnalysisResultSerializer.Meta.fields + ['windows']
+
+
+class RunSerializer(serializers.ModelSerializer):
+    results = AnalysisResultSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Run
+        fields = ['id', 'runner_id', 'recorded_at', 'content_hash', 'filename', 'file_size', 'results']
+
+
+class RunDetailSerializer(RunSerializer):
+    results = AnalysisResultDetailSerializer(many=True, read_only=True)
@@ -19,111 +19,138 @@ except ImportError:
     SCIPY_AVAILABLE = False
     print("WARNING: SciPy/NumPy is not available. Using simplified analysis.")
 
-# MediaPipeの利用可能性チェック
-try:
-    import mediapipe as mp
-    MEDIAPIPE_AVAILABLE = True
-except ImportError:
-    MEDIAPIPE_AVAILABLE = False
+# 姿勢推定バックエンド（MediaPipe / ONNX Runtime）の利用可能性チェック
+from .pose_backends import MEDIAPIPE_AVAILABLE, get_pose_backend, resolve_pose_backend_name
+
+if not MEDIAPIPE_AVAILABLE:
     print("WARNING: MediaPipe is not available. Some functionality may be limited.")
 
 
-def analyze_run_basics(video_path):
+class PoseAnalysisError(Exception):
+    """
+    明示的に指定された姿勢推定バックエンドでの解析に失敗したことを示す例外
+    """
+
+
+def _lean_angle_from_keypoints(keypoints):
+    """
+    肩と腰の中心を結ぶ線の垂直線に対する角度（度）を返す（計算できなければ None）
+    """
+    left_hip, right_hip = keypoints['left_hip'], keypoints['right_hip']
+    left_shoulder, right_shoulder = keypoints['left_shoulder'], keypoints['right_shoulder']
+    hip_center_x = (left_hip[0] + right_hip[0]) / 2
+    hip_center_y = (left_hip[1] + right_hip[1]) / 2
+    shoulder_center_x = (left_shoulder[0] + right_shoulder[0]) / 2
+    shoulder_center_y = (left_shoulder[1] + right_shoulder[1]) / 2
+
+    if shoulder_center_y == hip_center_y:
+        return None
+
+    # ベクトルの計算
+    dx = shoulder_center_x - hip_center_x
+    dy = shoulder_center_y - hip_center_y
+
+    # 垂直線（Y軸）に対する角度を計算
+    angle_rad = math.atan2(dx, -dy)  # -dyは座標系の向きを調整
+    angle_deg = math.degrees(angle_rad)
+
+    # 角度を0-180度の範囲に正規化
+    if angle_deg < 0:
+        angle_deg += 180
+    return angle_deg
+
+
+def analyze_run_basics(video_path, pose_backend=None):
     """
     ランニング動画から歩数と前傾角度を解析する関数
     
     Args:
         video_path (str): 解析対象の動画ファイルパス
+        pose_backend (str): 姿勢推定バックエンド名（省略時は設定値 POSE_BACKEND）
         
     Returns:
-        dict: {"step_count": int, "average_lean_angle": float}
+        dict: {"step_count": int, "average_lean_angle": float, "step_frames": list,
+               "series": {"hip_y": list, "lean_angle": list}, "series_fps": float,
+               "series_frames": list, "analyzed_frame_count": int, "pose_backend": str}
+              姿勢を検出できなかったフレームは series に含まれないため、series_frames に
+              各サンプルの元フレーム番号を、step_frames にはフレーム番号を返す。
     """
     # 必要なライブラリの利用可能性チェック
     if not OPENCV_AVAILABLE:
         raise ImportError("OpenCV is not available. Please install opencv-python")
-    if not MEDIAPIPE_AVAILABLE:
-        raise ImportError("MediaPipe is not available. Please install mediapipe: pip install mediapipe")
     if not SCIPY_AVAILABLE:
         raise ImportError("SciPy/NumPy is not available. Please install scipy numpy")
     
-    # MediaPipeの初期化
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(
-        static_image_mode=False,
-        model_complexity=1,
-        enable_segmentation=False,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
-    
     # 動画の読み込み
     cap = cv2.VideoCapture(video_path)
     
     if not cap.isOpened():
         raise ValueError("動画ファイルを開けませんでした")
     
+    # 姿勢推定バックエンドの初期化（失敗した場合も動画は解放する）
+    try:
+        backend = get_pose_backend(pose_backend)
+    except Exception:
+        cap.release()
+        raise
+    
     # 動画の情報を取得
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
     hip_y_coordinates = []  # 腰のY座標を記録するリスト
     lean_angles = []  # 前傾角度を記録するリスト
+    sample_frames = []  # 各サンプルの元フレーム番号（検出できなかったフレームは飛ぶ）
     
     frame_count = 0
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    def process_frames(frames, first_frame_index):
+        # 姿勢推定の実行（バックエンドによっては複数フレームをまとめて推論）
+        for offset, keypoints in enumerate(backend.process_batch(frames)):
+            if keypoints is None:
+                continue
             
-        # フレームをRGBに変換（MediaPipeはRGBを期待）
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # 姿勢推定の実行
-        results = pose.process(rgb_frame)
-        
-        if results.pose_landmarks:
-            landmarks = results.pose_landmarks.landmark
+            # 前傾角度の計算（肩と腰を結ぶ線の垂直線に対する角度）
+            # 時系列の長さをそろえるため、角度を計算できないフレームは腰の座標も記録しない
+            angle_deg = _lean_angle_from_keypoints(keypoints)
+            if angle_deg is None:
+                continue
             
-            # 腰の中心座標を計算（ランドマーク23と24の中点）
-            left_hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value]
-            right_hip = landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value]
-            hip_center_y = (left_hip.y + right_hip.y) / 2
+            # 腰の中心座標を計算
+            hip_center_y = (keypoints['left_hip'][1] + keypoints['right_hip'][1]) / 2
             hip_y_coordinates.append(hip_center_y)
+            lean_angles.append(angle_deg)
+            sample_frames.append(first_frame_index + offset)
+    
+    try:
+        pending_frames = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
             
-            # 肩の中心座標を計算（ランドマーク11と12の中点）
-            left_shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value]
-            right_shoulder = landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value]
-            shoulder_center_x = (left_shoulder.x + right_shoulder.x) / 2
-            shoulder_center_y = (left_shoulder.y + right_shoulder.y) / 2
-            
-            hip_center_x = (left_hip.x + right_hip.x) / 2
-            
-            # 前傾角度の計算（肩と腰を結ぶ線の垂直線に対する角度）
-            if shoulder_center_y != hip_center_y:
-                # ベクトルの計算
-                dx = shoulder_center_x - hip_center_x
-                dy = shoulder_center_y - hip_center_y
-                
-                # 垂直線（Y軸）に対する角度を計算
-                angle_rad = math.atan2(dx, -dy)  # -dyは座標系の向きを調整
-                angle_deg = math.degrees(angle_rad)
-                
-                # 角度を0-180度の範囲に正規化
-                if angle_deg < 0:
-                    angle_deg += 180
-                    
-                lean_angles.append(angle_deg)
+            pending_frames.append(frame)
+            frame_count += 1
+            if len(pending_frames) >= backend.batch_size:
+                process_frames(pending_frames, frame_count - len(pending_frames))
+                pending_frames = []
         
-        frame_count += 1
-    
-    cap.release()
-    pose.close()
+        if pending_frames:
+            process_frames(pending_frames, frame_count - len(pending_frames))
+    finally:
+        cap.release()
+        backend.close()
     
     # 歩数の計算（改善版：より高精度な歩数検出）
     step_count = 0
+    valid_peaks = []  # 検出した歩（腰の谷）の位置（first_frame からのフレーム数）
+    first_frame = 0
     if len(hip_y_coordinates) > 10:  # 最低限のデータ数が必要
-        hip_y_array = np.array(hip_y_coordinates)
+        # 検出できなかったフレームを線形補間し、フレーム単位の時間軸で歩を検出する
+        first_frame = sample_frames[0]
+        hip_y_array = np.interp(
+            np.arange(first_frame, sample_frames[-1] + 1), sample_frames, hip_y_coordinates
+        )
         
         # 1. データの平滑化（ノイズ除去）
         if len(hip_y_array) > 5:
@@ -144,7 +171,7 @@ def analyze_run_basics(video_path):
             
             # 実際のFPSを使用（フォールバック付き）
             actual_fps = fps if fps > 0 else 30.0  # デフォルト30fps
-            video_duration = len(hip_y_coordinates) / actual_fps
+            video_duration = frame_count / actual_fps
             
             # 現実的な歩行周期制約（0.8-1.5秒の間隔）
             min_step_interval = int(0.8 * actual_fps)  # 最小歩行間隔（フレーム数）
@@ -193,7 +220,8 @@ def analyze_run_basics(video_path):
                 step_count = max_reasonable_steps
             
             # デバッグ情報（ログに出力）
-            print(f"歩数検出デバッグ: フレーム数={len(hip_y_coordinates)}, FPS={actual_fps:.1f}, "
+            print(f"歩数検出デバッグ: フレーム数={frame_count}, 検出フレーム数={len(hip_y_coordinates)}, "
+                  f"FPS={actual_fps:.1f}, "
                   f"動画時間={video_duration:.1f}秒, 標準偏差={hip_y_std:.4f}, "
                   f"生ピーク数={len(peaks) if 'peaks' in locals() else 0}, "
                   f"有効ピーク数={len(valid_peaks) if 'valid_peaks' in locals() else 0}, "
@@ -206,7 +234,17 @@ def analyze_run_basics(video_path):
     
     return {
         "step_count": step_count,
-        "average_lean_angle": round(average_lean_angle, 1)
+        "average_lean_angle": round(average_lean_angle, 1),
+        "step_frames": [int(p) + first_frame for p in valid_peaks],
+        # フレームごとの時系列（表示・詳細分析用）
+        "series": {
+            "hip_y": [float(v) for v in hip_y_coordinates],
+            "lean_angle": [float(v) for v in lean_angles],
+        },
+        "series_fps": fps if fps > 0 else 30.0,
+        "series_frames": sample_frames,
+        "analyzed_frame_count": frame_count,
+        "pose_backend": backend.name
     }
 
 
@@ -218,7 +256,8 @@ def analyze_run_basic_opencv_only(video_path):
         video_path (str): 解析対象の動画ファイルパス
         
     Returns:
-        dict: {"step_count": int, "average_lean_angle": float, "method": str}
+        dict: {"step_count": int, "average_lean_angle": float, "method": str,
+               "series": {"motion": list}, "series_fps": float}
     """
     # OpenCVの利用可能性チェック
     if not OPENCV_AVAILABLE:
@@ -284,7 +323,13 @@ def analyze_run_basic_opencv_only(video_path):
     return {
         "step_count": step_count,
         "average_lean_angle": estimated_lean_angle,
-        "method": "opencv_basic"
+        "method": "opencv_basic",
+        # フレームごとのモーション量（表示・詳細分析用）
+        "series": {
+            "motion": [float(v) for v in frame_diffs],
+        },
+        "series_fps": fps if fps > 0 else 30.0,
+        "analyzed_frame_count": frame_count
     }
 
 
@@ -342,4 +387,154 @@ def analyze_run_dummy(video_path):
             "note": f"解析処理でエラーが発生しました: {str(e)[:50]}",
             "confidence": "none",
             "analysis_time": "instant"
-        } 
\ No newline at end of file
+        } 
+
+def probe_video(video_path):
+    """
+    動画の解像度・FPS・フレーム数・コーデックを取得する（取得できなければ None）
+    """
+    if not OPENCV_AVAILABLE:
+        return None
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        return {
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": round(cap.get(cv2.CAP_PROP_FPS), 2),
+            "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "codec": ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 '),
+        }
+    finally:
+        cap.release()
+
+
+def run_video_analysis(video_path, content_hash=None, pose_backend=None, require_backend=False):
+    """
+    ディスク上の動画ファイルを利用可能な最良の方法で解析する
+
+    解析前に解像度・FPS・コーデックを正規化したプロキシ動画（コンテンツ
+    ハッシュ単位でキャッシュ）に変換し、姿勢推定 → OpenCVのみ →
+    ダミー解析の順にフォールバックする。
+
+    Args:
+        video_path (str): 解析対象の動画ファイルパス
+        content_hash (str): 動画のSHA-256（プロキシのキャッシュキー、省略可）
+        pose_backend (str): 姿勢推定バックエンド名（省略時は設定値 POSE_BACKEND）
+        require_backend (bool): 姿勢推定に失敗した場合にフォールバックせず例外にする
+                                （クライアントがバックエンドを明示した場合）
+
+    Returns:
+        dict: 解析結果（"method" に使用した解析方法、"video_info" に元動画の情報を含む）
+
+    Raises:
+        PoseAnalysisError: require_backend で姿勢推定解析に失敗した場合
+    """
+    from .transcode import get_analysis_proxy
+
+    original_path = video_path
+    video_info = probe_video(original_path)
+    video_path = get_analysis_proxy(video_path, content_hash)
+    result = _run_best_analyzer(video_path, original_path, pose_backend, require_backend)
+    if video_info is not None:
+        result.setdefault("video_info", video_info)
+    return result
+
+
+def _run_best_analyzer(video_path, original_path, pose_backend, require_backend=False):
+    """
+    姿勢推定 → OpenCVのみ → ダミー解析の順に、最初に成功した解析結果を返す
+
+    require_backend の場合は、別の方法の結果を指定したバックエンドの結果として
+    返さないよう、姿勢推定に失敗した時点で PoseAnalysisError を送出する。
+    """
+    backend_name = resolve_pose_backend_name(pose_backend)
+    if require_backend and not (OPENCV_AVAILABLE and SCIPY_AVAILABLE and backend_name):
+        raise PoseAnalysisError(f"姿勢推定解析を実行できません: {pose_backend}")
+
+    if OPENCV_AVAILABLE and SCIPY_AVAILABLE and backend_name:
+        try:
+            result = analyze_run_basics(video_path, backend_name)
+            result.setdefault("method", backend_name)
+            return result
+        except Exception as e:
+            if require_backend:
+                raise PoseAnalysisError(f"姿勢推定解析（{backend_name}）でエラー: {str(e)}") from e
+            print(f"姿勢推定解析（{backend_name}）でエラー（OpenCV解析にフォールバック）: {str(e)}")
+
+    if OPENCV_AVAILABLE and SCIPY_AVAILABLE:
+        try:
+            return analyze_run_basic_opencv_only(video_path)
+        except Exception as e:
+            print(f"OpenCV解析でエラー（ダミー解析にフォールバック）: {str(e)}")
+
+    return analyze_run_dummy(original_path)
+
+
+def summarize_series(analysis_result, window_seconds=10.0):
+    """
+    解析結果の時系列から動画全体と一定区間ごとの指標を計算する
+
+    時間軸は元動画のフレーム番号で取る（姿勢を検出できなかったフレームで
+    時系列が詰まっていても、動画の長さと区間の時刻はずれない）。
+
+    Args:
+        analysis_result (dict): 解析結果（"series", "series_fps", "series_frames",
+                                "analyzed_frame_count", "step_frames" を使用）
+        window_seconds (float): 区間の長さ（秒）
+
+    Returns:
+        dict: {"duration_sec": float, "cadence": float, "windows": list}
+              時系列がない解析方法の場合は値が None、windows は空リスト
+    """
+    series = analysis_result.get("series") or {}
+    fps = analysis_result.get("series_fps") or 30.0
+    lean_angles = series.get("lean_angle") or []
+    step_frames = analysis_result.get("step_frames")
+    sample_count = max((len(values) for values in series.values()), default=0)
+
+    if sample_count == 0:
+        return {"duration_sec": None, "cadence": None, "windows": []}
+
+    # 各サンプルのフレーム番号（記録がない解析結果は1サンプル = 1フレーム）
+    sample_frames = analysis_result.get("series_frames") or range(sample_count)
+    frame_count = analysis_result.get("analyzed_frame_count") or sample_count
+
+    duration_sec = frame_count / fps
+    cadence = None
+    if step_frames is not None and duration_sec > 0:
+        cadence = round(analysis_result.get("step_count", len(step_frames)) / duration_sec * 60, 1)
+
+    window_size = max(1, int(window_seconds * fps))
+    window_count = (frame_count + window_size - 1) // window_size
+    window_leans = [[] for _ in range(window_count)]
+    for frame, angle in zip(sample_frames, lean_angles):
+        if 0 <= frame < frame_count:
+            window_leans[frame // window_size].append(angle)
+    window_steps = [0] * window_count
+    for frame in step_frames or []:
+        if 0 <= frame < frame_count:
+            window_steps[frame // window_size] += 1
+
+    windows = []
+    for window_index in range(window_count):
+        start = window_index * window_size
+        end = min(start + window_size, frame_count)
+        window_duration = (end - start) / fps
+
+        window_cadence = None
+        if step_frames is not None:
+            window_cadence = round(window_steps[window_index] / window_duration * 60, 1)
+
+        window_lean = window_leans[window_index]
+        windows.append({
+            "window_index": window_index,
+            "start_sec": round(start / fps, 2),
+            "end_sec": round(end / fps, 2),
+            "cadence": window_cadence,
+            "average_lean_angle": round(sum(window_lean) / len(window_lean), 1) if window_lean else None,
+        })
+
+    return {"duration_sec": round(duration_sec, 2), "cadence": cadence, "windows": windows}
@@ -0,0 +1,574 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import history, profiling, transcode, uploads
+from . import admission
+from .admission import (
+    MAX_RETRY_AFTER_SECONDS, PRUNE_INTERVAL_SECONDS, STORE_BUSY_RETRY_AFTER_SECONDS, AdmissionRejected,
+    MemoryAdmissionStore, SQLiteAdmissionStore,
+)
+from .middleware import AdmissionControlMiddleware
+from . import services
+from .services import PoseAnalysisError, summarize_series
+
+ADMISSION_CONTROL = {
+    'CLIENT_BURST_CPU_SECONDS': 100.0,
+    'CLIENT_REFILL_CPU_SECONDS_PER_SECOND': 1.0,
+    'MAX_CONCURRENT_ANALYSES': 2,
+    'MAX_INFLIGHT_BYTES': 1000,
+    'MAX_INFLIGHT_CPU_SECONDS': 1000.0,
+    'INFLIGHT_TTL_SECONDS': 900,
+}
+
+
+def analysis_cost(cpu_seconds, fixed_cpu_seconds=0.0, size=0):
+    return {"bytes": size, "cpu_seconds": cpu_seconds, "fixed_cpu_seconds": fixed_cpu_seconds, "analysis": True}
+
+
+def upload_cost(cpu_seconds, size=0):
+    return {"bytes": size, "cpu_seconds": cpu_seconds, "fixed_cpu_seconds": cpu_seconds, "analysis": False}
+
+
+@override_settings(ADMISSION_CONTROL=ADMISSION_CONTROL)
+class MemoryAdmissionStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = self.make_store()
+
+    def make_store(self):
+        return MemoryAdmissionStore()
+
+    def tokens(self, client_key='ip:a', now=0.0):
+        with self.store._transaction():
+            return self.store._refill(client_key, now)
+
+    def bucket_count(self):
+        with self.store._transaction():
+            return sum(1 for key in ('ip:a', 'ip:b', 'ip:c') if self.store._get_bucket(key) is not None)
+
+    def test_new_client_starts_with_full_bucket(self):
+        self.assertEqual(self.tokens(), 100.0)
+
+    def test_admit_charges_fixed_and_refundable_parts(self):
+        ticket_id, refundable_charge = self.store.try_admit('ip:a', analysis_cost(30.0, 5.0), now=1.0)
+        self.assertTrue(ticket_id)
+        self.assertEqual(refundable_charge, 30.0)
+        self.assertEqual(self.tokens(now=1.0), 65.0)
+
+    def test_bucket_refills_up_to_capacity(self):
+        self.store.try_admit('ip:a', analysis_cost(60.0), now=1.0)
+        self.assertEqual(self.tokens(now=11.0), 50.0)
+        self.assertEqual(self.tokens(now=1000.0), 100.0)
+
+    def test_rejects_with_retry_after_from_refill_rate(self):
+        self.store.try_admit('ip:a', analysis_cost(90.0), now=1.0)
+        with self.assertRaises(AdmissionRejected) as context:
+            self.store.try_admit('ip:a', analysis_cost(30.0), now=1.0)
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(context.exception.retry_after, 20)
+
+    def test_other_clients_are_not_affected(self):
+        self.store.try_admit('ip:a', analysis_cost(100.0), now=1.0)
+        self.store.try_admit('ip:b', analysis_cost(50.0), now=1.0)
+        self.assertEqual(self.tokens('ip:b', now=1.0), 50.0)
+
+    def test_zero_refill_rate_does_not_divide_by_zero(self):
+        config = dict(ADMISSION_CONTROL, CLIENT_REFILL_CPU_SECONDS_PER_SECOND=0.0)
+        with self.settings(ADMISSION_CONTROL=config):
+            self.store.try_admit('ip:a', analysis_cost(90.0), now=1.0)
+            with self.assertRaises(AdmissionRejected) as context:
+                self.store.try_admit('ip:a', analysis_cost(30.0), now=1.0)
+        self.assertEqual(context.exception.retry_after, MAX_RETRY_AFTER_SECONDS)
+
+    def test_charge_is_capped_at_bucket_capacity(self):
+        ticket_id, refundable_charge = self.store.try_admit('ip:a', analysis_cost(500.0, 40.0), now=1.0)
+        self.assertEqual(refundable_charge, 60.0)
+        self.assertEqual(self.tokens(now=1.0), 0.0)
+
+    def test_release_refunds_only_the_capped_charge(self):
+        ticket_id, refundable_charge = self.store.try_admit('ip:a', analysis_cost(500.0, 40.0), now=1.0)
+        self.store.release(ticket_id, 'ip:a', refundable_charge, cpu_used=0.0, now=1.0)
+        self.assertEqual(self.tokens(now=1.0), 60.0)
+
+    def test_release_never_refunds_fixed_charge(self):
+        ticket_id, refundable_charge = self.store.try_admit('ip:a', analysis_cost(30.0, 10.0), now=1.0)
+        self.store.release(ticket_id, 'ip:a', refundable_charge, cpu_used=0.0, now=1.0)
+        self.assertEqual(self.tokens(now=1.0), 90.0)
+
+    def test_release_charges_cpu_above_estimate(self):
+        ticket_id, refundable_charge = self.store.try_admit('ip:a', analysis_cost(30.0), now=1.0)
+        self.store.release(ticket_id, 'ip:a', refundable_charge, cpu_used=50.0, now=1.0)
+        self.assertEqual(self.tokens(now=1.0), 50.0)
+
+    def test_release_without_cpu_used_keeps_upload_charge(self):
+        ticket_id, refundable_charge = self.store.try_admit('ip:a', upload_cost(2.0), now=1.0)
+        self.assertEqual(refundable_charge, 0.0)
+        self.store.release(ticket_id, 'ip:a', refundable_charge, now=1.0)
+        self.assertEqual(self.tokens(now=1.0), 98.0)
+
+    def test_release_removes_inflight_ticket(self):
+        ticket_id, _ = self.store.try_admit('ip:a', analysis_cost(10.0, size=100), now=1.0)
+        self.assertEqual(self.store._get_inflight_totals(1.0), (1, 1, 100, 10.0))
+        self.store.release(ticket_id, 'ip:a', now=1.0)
+        self.assertEqual(self.store._get_inflight_totals(1.0), (0, 0, 0, 0))
+
+    def test_global_concurrency_limit_returns_503(self):
+        self.store.try_admit('ip:a', analysis_cost(1.0), now=1.0)
+        self.store.try_admit('ip:b', analysis_cost(1.0), now=1.0)
+        with self.assertRaises(AdmissionRejected) as context:
+            self.store.try_admit('ip:c', analysis_cost(1.0), now=1.0)
+        self.assertEqual(context.exception.status_code, 503)
+
+    def test_expired_inflight_tickets_are_dropped(self):
+        self.store.try_admit('ip:a', analysis_cost(1.0), now=1.0)
+        self.store.try_admit('ip:b', analysis_cost(1.0), now=1.0)
+        self.store.try_admit('ip:c', analysis_cost(1.0), now=1000.0)
+
+    def test_full_buckets_are_pruned(self):
+        def admit(client_key, charge, now):
+            ticket_id, refundable_charge = self.store.try_admit(client_key, upload_cost(charge), now=now)
+            self.store.release(ticket_id, client_key, refundable_charge, now=now)
+
+        admit('ip:a', 50.0, now=1.0)
+        admit('ip:b', 90.0, now=PRUNE_INTERVAL_SECONDS + 2.0)
+        self.assertEqual(self.bucket_count(), 2)
+
+        # 満タンになってから capacity / refill（100秒）経ったバケットだけを削除する
+        admit('ip:c', 1.0, now=200.0)
+        self.assertEqual(self.bucket_count(), 2)
+        admit('ip:c', 1.0, now=300.0)
+        self.assertEqual(self.bucket_count(), 1)
+        self.assertEqual(self.tokens('ip:b', now=300.0), 100.0)
+
+
+class SQLiteAdmissionStoreTests(MemoryAdmissionStoreTests):
+    """
+    同じ判定ロジックを SQLite ストアでも確認する（gunicornの複数ワーカー間で共有する既定のストア）
+    """
+
+    def make_store(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        self.path = os.path.join(temp_dir, 'admission.sqlite3')
+        return SQLiteAdmissionStore(self.path, timeout=0.1)
+
+    def test_state_is_shared_between_store_instances(self):
+        self.store.try_admit('ip:a', analysis_cost(40.0), now=1.0)
+        other_worker = SQLiteAdmissionStore(self.path, timeout=0.1)
+        with other_worker._transaction():
+            self.assertEqual(other_worker._refill('ip:a', 1.0), 60.0)
+            self.assertEqual(other_worker._get_inflight_totals(1.0)[0], 1)
+
+    def test_locked_store_rejects_with_503(self):
+        # 別のワーカーが BEGIN IMMEDIATE で書き込みロックを保持している間は判定できない
+        other_worker = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(other_worker.close)
+        other_worker.execute("BEGIN IMMEDIATE")
+        try:
+            with self.assertRaises(AdmissionRejected) as context:
+                self.store.try_admit('ip:a', analysis_cost(10.0), now=1.0)
+        finally:
+            other_worker.execute("ROLLBACK")
+        self.assertEqual(context.exception.status_code, 503)
+        self.assertEqual(context.exception.retry_after, STORE_BUSY_RETRY_AFTER_SECONDS)
+
+        # ロック解放後は通常どおり受け付け、拒否されたリクエストは課金されていない
+        self.store.try_admit('ip:a', analysis_cost(10.0), now=1.0)
+        self.assertEqual(self.tokens(now=1.0), 90.0)
+
+
+class AdmissionControlMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        overrides = override_settings(ADMISSION_CONTROL=dict(
+            settings.ADMISSION_CONTROL, ENABLED=True, API_KEYS=set(), TRUST_X_FORWARDED_FOR=False,
+            CLIENT_BURST_CPU_SECONDS=10.0, CLIENT_REFILL_CPU_SECONDS_PER_SECOND=0.5,
+            BASE_CPU_SECONDS=8.0, CPU_SECONDS_PER_MB=0.0, ANALYSIS_FIXED_CPU_SECONDS_PER_MB=0.0,
+            UPLOAD_CPU_SECONDS_PER_MB=8.0,
+        ))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.store = MemoryAdmissionStore()
+        patcher = mock.patch.object(admission, 'get_admission_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def analyze_request(self):
+        return self.factory.post('/api/analyze/', b'x' * 100, content_type='application/octet-stream')
+
+    def inflight_count(self):
+        with self.store._transaction():
+            return self.store._get_inflight_totals(time.time())[0]
+
+    def test_rejected_request_gets_retry_after(self):
+        # アップロードの課金は返却されないため、2回目はバケットが足りない
+        middleware = AdmissionControlMiddleware(lambda request: JsonResponse({}))
+        self.assertEqual(middleware(self.factory.post('/api/uploads/', {})).status_code, 200)
+
+        response = middleware(self.factory.post('/api/uploads/', {}))
+        self.assertEqual(response.status_code, 429)
+        retry_after = int(response['Retry-After'])
+        self.assertGreater(retry_after, 0)
+        self.assertEqual(json.loads(response.content)["retry_after"], retry_after)
+
+    def test_missing_content_length_returns_411(self):
+        request = self.analyze_request()
+        del request.META['CONTENT_LENGTH']
+        request.META['HTTP_TRANSFER_ENCODING'] = 'chunked'
+        response = AdmissionControlMiddleware(lambda request: JsonResponse({}))(request)
+        self.assertEqual(response.status_code, 411)
+        self.assertEqual(self.inflight_count(), 0)
+
+    def test_ticket_is_released_when_view_raises(self):
+        def failing_view(request):
+            self.assertEqual(self.inflight_count(), 1)
+            raise RuntimeError("view failed")
+
+        with self.assertRaises(RuntimeError):
+            AdmissionControlMiddleware(failing_view)(self.analyze_request())
+        self.assertEqual(self.inflight_count(), 0)
+
+    def test_deferred_ticket_is_not_released_by_middleware(self):
+        def background_view(request):
+            self.ticket = admission.defer_release(request)
+            return JsonResponse({}, status=202)
+
+        AdmissionControlMiddleware(background_view)(self.analyze_request())
+        self.assertEqual(self.inflight_count(), 1)
+        self.ticket.release(cpu_used=0.0)
+        self.assertEqual(self.inflight_count(), 0)
+
+    def test_other_requests_are_not_controlled(self):
+        request = self.factory.get('/api/health/')
+        AdmissionControlMiddleware(lambda request: JsonResponse({}))(request)
+        self.assertFalse(hasattr(request, 'admission_ticket'))
+
+
+class UploadApiTests(TestCase):
+    """
+    再開可能アップロードの一連のAPI（開始 → チャンク送信 → 状態確認 → 結合・解析）
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_MIN_CHUNK_SIZE=1,
+            ADMISSION_CONTROL=dict(settings.ADMISSION_CONTROL, ENABLED=False),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def put_chunk(self, upload_id, index, chunk):
+        return self.client.put(
+            f'/api/uploads/{upload_id}/chunks/{index}/', chunk,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_SHA256=hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_upload_round_trip(self):
+        data = b'0123456789' * 10
+        response = self.client.post('/api/uploads/', {
+            "filename": "run.mp4", "total_size": len(data), "chunk_size": 40,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()["upload_id"]
+        self.assertEqual(response.json()["chunk_count"], 3)
+
+        self.assertEqual(self.put_chunk(upload_id, 0, data[:40]).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 2, data[80:]).status_code, 200)
+
+        response = self.client.get(f'/api/uploads/{upload_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["missing_chunks"], [1])
+        self.assertEqual(response.json()["received_ranges"], [[0, 40], [80, 100]])
+
+        response = self.client.post(f'/api/uploads/{upload_id}/finalize/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+
+        self.assertEqual(self.put_chunk(upload_id, 1, data[40:80]).status_code, 200)
+        response = self.client.get(f'/api/uploads/{upload_id}/')
+        self.assertTrue(response.json()["complete"])
+
+        finalize_url = f'/api/uploads/{upload_id}/finalize/'
+        body = {"sha256": hashlib.sha256(data).hexdigest()}
+        response = self.client.post(finalize_url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+        # 解析はバックグラウンドで実行され、結果は状態確認APIで受け取る
+        status_response = self.wait_for_analysis(upload_id)
+        self.assertEqual(status_response["analysis_status"], "completed")
+        result = status_response["result"]
+        self.assertEqual(result["content_hash"], body["sha256"])
+
+        # 再試行しても同じ結果が返る
+        response = self.client.post(finalize_url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), result)
+
+    def wait_for_analysis(self, upload_id, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            response = self.client.get(f'/api/uploads/{upload_id}/').json()
+            if response["analysis_status"] != "processing" or time.monotonic() > deadline:
+                return response
+            time.sleep(0.05)
+
+    def test_failed_requested_backend_marks_upload_failed(self):
+        response = self.client.post('/api/uploads/', {
+            "filename": "run.mp4", "total_size": 10,
+        }, content_type='application/json')
+        upload_id = response.json()["upload_id"]
+        self.put_chunk(upload_id, 0, b'0123456789')
+
+        with mock.patch('analysis.views._get_pose_backend_param', return_value='onnx'), \
+                mock.patch('analysis.views.run_video_analysis', side_effect=PoseAnalysisError("推論に失敗")) as analyze:
+            response = self.client.post(
+                f'/api/uploads/{upload_id}/finalize/', {"pose_backend": "onnx"}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 202)
+            status_response = self.wait_for_analysis(upload_id)
+
+        # 推定値で代用せず失敗として記録する（finalize の再送で再解析できる）
+        self.assertEqual(analyze.call_args.args[2:], ('onnx', True))
+        self.assertEqual(status_response["analysis_status"], "failed")
+        self.assertIn("推論に失敗", status_response["error"])
+        self.assertIsNone(status_response.get("result"))
+
+    def test_failed_requested_backend_returns_error_from_analyze(self):
+        video = SimpleUploadedFile('run.mp4', b'0123456789', content_type='video/mp4')
+        with mock.patch('analysis.views._get_pose_backend_param', return_value='onnx'), \
+                mock.patch('analysis.views.run_video_analysis', side_effect=PoseAnalysisError("推論に失敗")):
+            response = self.client.post('/api/analyze/', {"video": video, "pose_backend": "onnx"})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["pose_backend"], 'onnx')
+
+    def test_profile_id_is_returned_only_to_profiling_admins(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir, ignore_errors=True)
+        response = self.client.post('/api/uploads/', {
+            "filename": "run.mp4", "total_size": 10,
+        }, content_type='application/json')
+        upload_id = response.json()["upload_id"]
+        self.put_chunk(upload_id, 0, b'0123456789')
+
+        with override_settings(PROFILING_DIR=profile_dir, PROFILING_TOKEN='secret', PROFILING_SAMPLE_RATE=1.0), \
+                mock.patch('analysis.views.run_video_analysis', side_effect=lambda *args: measured_result()):
+            self.client.post(f'/api/uploads/{upload_id}/finalize/', {}, content_type='application/json')
+            status_response = self.wait_for_analysis(upload_id)
+            self.assertEqual(status_response["analysis_status"], "completed")
+            self.assertNotIn("profile_id", status_response)
+            self.assertNotIn("profile_id", status_response["result"])
+
+            admin_status = self.client.get(f'/api/uploads/{upload_id}/', HTTP_X_PROFILE_TOKEN='secret').json()
+            admin_finalize = self.client.post(
+                f'/api/uploads/{upload_id}/finalize/', {}, content_type='application/json', HTTP_X_PROFILE_TOKEN='secret'
+            ).json()
+        self.assertEqual(admin_finalize["profile_id"], admin_status["profile_id"])
+
+    def test_finalize_while_processing_returns_202(self):
+        response = self.client.post('/api/uploads/', {
+            "filename": "run.mp4", "total_size": 10,
+        }, content_type='application/json')
+        upload_id = response.json()["upload_id"]
+        self.put_chunk(upload_id, 0, b'0123456789')
+
+        with uploads.FinalizeLock(upload_id):
+            response = self.client.post(f'/api/uploads/{upload_id}/finalize/', {}, content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json()["analysis_status"], "processing")
+            self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').json()["analysis_status"], "processing")
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').json()["analysis_status"], "pending")
+
+    def test_unknown_upload_returns_404(self):
+        response = self.client.get('/api/uploads/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_checksum_mismatch_is_rejected(self):
+        response = self.client.post('/api/uploads/', {
+            "filename": "run.mp4", "total_size": 10,
+        }, content_type='application/json')
+        upload_id = response.json()["upload_id"]
+        response = self.client.put(
+            f'/api/uploads/{upload_id}/chunks/0/', b'0123456789',
+            content_type='application/octet-stream', HTTP_X_CHUNK_SHA256='0' * 64,
+        )
+        self.assertEqual(response.status_code, 422)
+
+
+@mock.patch.object(services, 'OPENCV_AVAILABLE', True)
+@mock.patch.object(services, 'SCIPY_AVAILABLE', True)
+@mock.patch.object(services, 'resolve_pose_backend_name', return_value='onnx')
+@mock.patch.object(services, 'analyze_run_basic_opencv_only', return_value={"method": "opencv_basic"})
+@mock.patch.object(services, 'analyze_run_basics', side_effect=RuntimeError("推論に失敗"))
+class RunBestAnalyzerTests(SimpleTestCase):
+    def test_falls_back_when_backend_not_required(self, *mocks):
+        result = services._run_best_analyzer('proxy.avi', 'run.mp4', None)
+        self.assertEqual(result["method"], "opencv_basic")
+
+    def test_required_backend_failure_raises(self, analyze_run_basics, opencv_only, *mocks):
+        with self.assertRaises(PoseAnalysisError):
+            services._run_best_analyzer('proxy.avi', 'run.mp4', 'onnx', require_backend=True)
+        opencv_only.assert_not_called()
+
+
+def measured_result():
+    return {"method": "onnx", "step_count": 120, "average_lean_angle": 84.0}
+
+
+class ProfileIdExposureTests(TestCase):
+    """
+    プロファイルIDは履歴・キャッシュに保存せず、管理者のリクエストにのみ返す
+    """
+
+    def setUp(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir, ignore_errors=True)
+        overrides = override_settings(
+            PROFILING_DIR=profile_dir,
+            PROFILING_TOKEN='secret',
+            PROFILING_SAMPLE_RATE=1.0,
+            ADMISSION_CONTROL=dict(settings.ADMISSION_CONTROL, ENABLED=False),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for target, kwargs in (
+            ('analysis.views._get_pose_backend_param', {"return_value": 'onnx'}),
+            ('analysis.views.run_video_analysis', {"side_effect": lambda *args: measured_result()}),
+        ):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def analyze(self, content, **headers):
+        video = SimpleUploadedFile('run.mp4', content, content_type='video/mp4')
+        return self.client.post('/api/analyze/', {"video": video, "runner_id": "runner-1"}, **headers)
+
+    def test_profile_id_is_returned_only_to_profiling_admins(self):
+        response = self.analyze(b'sampled')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("profile_id", response.json())
+
+        response = self.analyze(b'admin', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("profile_id", response.json())
+
+        for saved in history.measured_results():
+            self.assertNotIn("profile_id", saved.raw)
+
+    def test_cached_result_does_not_leak_saved_profile_id(self):
+        content_hash = hashlib.sha256(b'legacy').hexdigest()
+        saved = history.save_analysis_result(measured_result(), content_hash, 'runner-1')
+        saved.raw["profile_id"] = "3f2b6c1e-0d4a-4f5e-9a7b-2c8d1e6f4a90"
+        saved.save()
+
+        cached = history.reuse_cached_result(content_hash, 'runner-2')
+        self.assertTrue(cached["cached"])
+        self.assertNotIn("profile_id", cached)
+
+
+class ProfileApiTests(SimpleTestCase):
+    """
+    管理者用プロファイルAPI（一覧に出るIDで詳細・ダウンロードを参照できること）
+    """
+
+    def setUp(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir, ignore_errors=True)
+        overrides = override_settings(
+            PROFILING_DIR=profile_dir,
+            PROFILING_TOKEN='secret',
+            ADMISSION_CONTROL=dict(settings.ADMISSION_CONTROL, ENABLED=False),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        profiler = profiling.SamplingProfiler(interval=0.001).start()
+        self.profile_id = profiling.save_profile(profiler.stop(), {"filename": "run.mp4"})
+
+    def test_listed_profile_can_be_fetched(self):
+        response = self.client.get('/api/admin/profiles/', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.json()["profiles"][0]["profile_id"]
+        self.assertEqual(profile_id, self.profile_id)
+
+        response = self.client.get(f'/api/admin/profiles/{profile_id}/', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["metadata"], {"filename": "run.mp4"})
+
+        response = self.client.get(f'/api/admin/profiles/{profile_id}/download/', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profiles_require_admin(self):
+        response = self.client.get(f'/api/admin/profiles/{self.profile_id}/')
+        self.assertEqual(response.status_code, 403)
+
+
+class SummarizeSeriesTests(SimpleTestCase):
+    def test_missed_frames_do_not_compress_the_time_axis(self):
+        # 20秒（30fps）の動画で、1フレームおきにしか姿勢を検出できなかった場合
+        sample_frames = list(range(0, 600, 2))
+        summary = summarize_series({
+            "step_count": 30,
+            "step_frames": list(range(10, 600, 20)),
+            "series": {"hip_y": [0.5] * 300, "lean_angle": [80.0] * 150 + [90.0] * 150},
+            "series_fps": 30.0,
+            "series_frames": sample_frames,
+            "analyzed_frame_count": 600,
+        })
+        self.assertEqual(summary["duration_sec"], 20.0)
+        self.assertEqual(summary["cadence"], 90.0)
+        self.assertEqual([(w["start_sec"], w["end_sec"]) for w in summary["windows"]], [(0.0, 10.0), (10.0, 20.0)])
+        self.assertEqual([w["cadence"] for w in summary["windows"]], [90.0, 90.0])
+        self.assertEqual([w["average_lean_angle"] for w in summary["windows"]], [80.0, 90.0])
+
+    def test_results_without_frame_numbers_use_sample_index(self):
+        summary = summarize_series({"series": {"motion": [1.0] * 450}, "series_fps": 30.0})
+        self.assertEqual(summary["duration_sec"], 15.0)
+        self.assertIsNone(summary["cadence"])
+        self.assertEqual(len(summary["windows"]), 2)
+        self.assertEqual(summary["windows"][1]["end_sec"], 15.0)
+
+    def test_no_series(self):
+        self.assertEqual(summarize_series({"step_count": 10}), {"duration_sec": None, "cadence": None, "windows": []})
+
+
+@override_settings(VIDEO_PROXY_FPS=30, VIDEO_PROXY_MAX_HEIGHT=480, VIDEO_PROXY_QUALITY=5,
+                   VIDEO_PROXY_TIMEOUT_SECONDS=300)
+class ProxyFpsTests(SimpleTestCase):
+    def ffmpeg_filter(self, ffprobe_output):
+        def run(command, **kwargs):
+            if command[0] == 'ffprobe':
+                return subprocess.CompletedProcess(command, 0, stdout=ffprobe_output)
+            return subprocess.CompletedProcess(command, 0)
+
+        with mock.patch.object(transcode.shutil, 'which', return_value='/usr/bin/ffprobe'), \
+                mock.patch.object(transcode.subprocess, 'run', side_effect=run) as run_mock:
+            transcode._transcode_with_ffmpeg('in.mp4', 'out.avi')
+        command = run_mock.call_args_list[-1].args[0]
+        return command[command.index('-vf') + 1]
+
+    def test_ffmpeg_does_not_upsample_low_fps_sources(self):
+        self.assertTrue(self.ffmpeg_filter('25/1\n').endswith(',fps=25'))
+        self.assertTrue(self.ffmpeg_filter('24000/1001\n').endswith(',fps=23.97602398'))
+
+    def test_ffmpeg_downsamples_high_fps_sources(self):
+        self.assertTrue(self.ffmpeg_filter('60/1\n').endswith(',fps=30'))
+
+    def test_unknown_source_fps_uses_default(self):
+        self.assertEqual(transcode.proxy_fps(None), 30.0)
+        self.assertEqual(transcode.proxy_fps(0.0), 30.0)
+        self.assertEqual(transcode.proxy_fps(25.0), 25.0)
@@ -0,0 +1,245 @@
+# 解析用プロキシ動画の作成（解像度・FPS・コーデックの正規化）
+import hashlib
+import os
+import shutil
+import subprocess
+import time
+import uuid
+
+from django.conf import settings
+
+# OpenCVの利用可能性チェック
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+
+# プロキシはフレーム内圧縮のみのMJPEG（デコードが軽く、シークも速い）
+PROXY_EXTENSION = '.avi'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """
+    ファイル全体のSHA-256をブロック単位で計算する
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_proxy_root():
+    """
+    プロキシ動画のキャッシュディレクトリを返す
+    """
+    proxy_root = os.path.join(settings.MEDIA_ROOT, 'proxies')
+    os.makedirs(proxy_root, exist_ok=True)
+    return proxy_root
+
+
+def proxy_path_for(content_hash):
+    """
+    コンテンツハッシュと現在の正規化設定に対応するプロキシのパスを返す
+
+    設定（解像度・FPS）をファイル名に含めるため、設定変更時は別キャッシュになる。
+    """
+    name = f"{content_hash}_{settings.VIDEO_PROXY_MAX_HEIGHT}p_{settings.VIDEO_PROXY_FPS}fps{PROXY_EXTENSION}"
+    return os.path.join(get_proxy_root(), name)
+
+
+def get_analysis_proxy(video_path, content_hash=None):
+    """
+    解析用プロキシ動画のパスを返す（なければ作成してキャッシュする）
+
+    正規化が無効な場合や作成に失敗した場合は元の動画パスを返すため、
+    呼び出し側は常に戻り値をそのまま解析に渡せばよい。
+
+    Args:
+        video_path (str): 元の動画ファイルパス
+        content_hash (str): 元の動画のSHA-256（省略時は計算する）
+
+    Returns:
+        str: 解析に使用する動画ファイルのパス
+    """
+    if not settings.VIDEO_PROXY_ENABLED:
+        return video_path
+
+    try:
+        content_hash = content_hash or file_sha256(video_path)
+        proxy_path = proxy_path_for(content_hash)
+        if os.path.exists(proxy_path):
+            os.utime(proxy_path)  # 最終利用時刻を更新（キャッシュ削除の判定用）
+            return proxy_path
+
+        purge_stale_proxies()
+
+        start_time = time.time()
+        temp_path = f"{proxy_path}.{uuid.uuid4().hex}.tmp{PROXY_EXTENSION}"
+        try:
+            if shutil.which('ffmpeg'):
+                _transcode_with_ffmpeg(video_path, temp_path)
+            elif OPENCV_AVAILABLE:
+                _transcode_with_opencv(video_path, temp_path)
+            else:
+                return video_path
+            os.replace(temp_path, proxy_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        print(f"プロキシ動画作成: {os.path.basename(proxy_path)}, "
+              f"{os.path.getsize(video_path) / (1024 * 1024):.1f}MB → "
+              f"{os.path.getsize(proxy_path) / (1024 * 1024):.1f}MB, "
+              f"{time.time() - start_time:.1f}秒")
+        return proxy_path
+
+    except Exception as e:
+        print(f"プロキシ動画の作成でエラー（元の動画で解析します）: {str(e)}")
+        return video_path
+
+
+def proxy_fps(source_fps):
+    """
+    プロキシのFPSを返す（元動画より高いFPSにはしない）
+
+    24/25fpsの動画を30fpsにするとフレームが複製され、動きのない偽のサンプルが
+    時系列に混ざるため、設定値と元動画のFPSの小さい方を使う。
+    """
+    source_fps = source_fps if source_fps and source_fps > 0 else 30.0
+    return min(float(settings.VIDEO_PROXY_FPS), source_fps)
+
+
+def _probe_source_fps(video_path):
+    """
+    元動画のFPSを返す（ffprobe → OpenCVの順に試し、取得できなければ None）
+    """
+    if shutil.which('ffprobe'):
+        try:
+            completed = subprocess.run(
+                [
+                    'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                    '-show_entries', 'stream=avg_frame_rate', '-of', 'default=noprint_wrappers=1:nokey=1',
+                    video_path,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+                timeout=30,
+            )
+            numerator, _, denominator = completed.stdout.strip().partition('/')
+            fps = float(numerator) / float(denominator or 1)
+            if fps > 0:
+                return fps
+        except (subprocess.SubprocessError, ValueError, ZeroDivisionError):
+            pass
+
+    if OPENCV_AVAILABLE:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            return fps if fps > 0 else None
+        finally:
+            cap.release()
+    return None
+
+
+def _transcode_with_ffmpeg(video_path, output_path):
+    """
+    ffmpegで解像度上限・固定FPS・MJPEGのプロキシを作成する
+    """
+    max_height = settings.VIDEO_PROXY_MAX_HEIGHT
+    target_fps = proxy_fps(_probe_source_fps(video_path))
+    video_filter = f"scale=-2:'trunc(min(ih,{max_height})/2)*2',fps={target_fps:.10g}"
+    subprocess.run(
+        [
+            'ffmpeg', '-v', 'error', '-y',
+            '-i', video_path,
+            '-an',
+            '-vf', video_filter,
+            '-c:v', 'mjpeg', '-q:v', str(settings.VIDEO_PROXY_QUALITY),
+            '-pix_fmt', 'yuvj420p',
+            output_path,
+        ],
+        check=True,
+        capture_output=True,
+        timeout=settings.VIDEO_PROXY_TIMEOUT_SECONDS,
+    )
+
+
+def _transcode_with_opencv(video_path, output_path):
+    """
+    OpenCVのみでプロキシを作成する（ffmpegがない環境向け）
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("動画ファイルを開けませんでした")
+
+    source_fps = cap.get(cv2.CAP_PROP_FPS)
+    source_fps = source_fps if source_fps > 0 else 30.0
+    target_fps = proxy_fps(source_fps)
+    frame_step = source_fps / target_fps
+
+    writer = None
+    frame_index = 0
+    next_output_index = 0.0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            # 固定FPSへの間引き（時間軸で最も近いフレームを採用）
+            if frame_index + 0.5 >= next_output_index:
+                height, width = frame.shape[:2]
+                if height > settings.VIDEO_PROXY_MAX_HEIGHT:
+                    scale = settings.VIDEO_PROXY_MAX_HEIGHT / height
+                    width = int(width * scale) // 2 * 2
+                    height = settings.VIDEO_PROXY_MAX_HEIGHT
+                    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+                if writer is None:
+                    writer = cv2.VideoWriter(
+                        output_path, cv2.VideoWriter_fourcc(*'MJPG'), target_fps, (width, height)
+                    )
+                    if not writer.isOpened():
+                        raise ValueError("プロキシ動画の書き込みを開始できませんでした")
+
+                writer.write(frame)
+                next_output_index += frame_step
+
+            frame_index += 1
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+    if writer is None:
+        raise ValueError("動画からフレームを読み込めませんでした")
+
+
+def purge_stale_proxies(max_age=None):
+    """
+    一定期間使われていないプロキシ動画を削除する
+
+    Returns:
+        int: 削除したファイル数
+    """
+    max_age = max_age if max_age is not None else settings.VIDEO_PROXY_CACHE_MAX_AGE_SECONDS
+    now = time.time()
+    purged = 0
+    proxy_root = get_proxy_root()
+    for name in os.listdir(proxy_root):
+        path = os.path.join(proxy_root, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                purged += 1
+        except OSError:
+            continue
+    return purged
@@ -0,0 +1,435 @@
+# 再開可能（チャンク分割）アップロードのストレージ処理
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+
+# fcntlの利用可能性チェック（Windowsの開発環境では結合処理の排他制御を行わない）
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# ストリーム読み書きのブロックサイズ（チャンク全体をメモリに載せない）
+STREAM_BLOCK_SIZE = 64 * 1024
+
+SESSION_FILE = 'session.json'
+FINALIZE_LOCK_FILE = 'finalize.lock'
+CHUNK_FILE_FORMAT = 'chunk_{:06d}.part'
+ASSEMBLED_FILE_PREFIX = 'assembled'
+
+
+class UploadError(Exception):
+    """
+    アップロード処理のエラー（views側でHTTPステータスに変換する）
+    """
+    status_code = 400
+
+
+class UploadSessionNotFound(UploadError):
+    status_code = 404
+
+
+class UploadIncomplete(UploadError):
+    status_code = 409
+
+
+def get_upload_root():
+    """
+    アップロードセッションを保存するディレクトリを返す
+    """
+    upload_root = os.path.join(settings.MEDIA_ROOT, 'uploads')
+    os.makedirs(upload_root, exist_ok=True)
+    return upload_root
+
+
+def _session_dir(upload_id):
+    return os.path.join(get_upload_root(), uuid.UUID(str(upload_id)).hex)
+
+
+def create_upload_session(filename, total_size, chunk_size=None):
+    """
+    アップロードセッションを作成する
+
+    Args:
+        filename (str): 元のファイル名
+        total_size (int): ファイル全体のバイト数
+        chunk_size (int): チャンクサイズ（省略時は設定値）
+
+    Returns:
+        dict: セッション情報
+    """
+    max_size = settings.RESUMABLE_UPLOAD_MAX_SIZE
+    if total_size <= 0:
+        raise UploadError("ファイルサイズが不正です")
+    if total_size > max_size:
+        error = UploadError(f"ファイルサイズが大きすぎます（上限 {max_size // (1024 * 1024)}MB）")
+        error.status_code = 413
+        raise error
+
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    chunk_size = max(settings.UPLOAD_MIN_CHUNK_SIZE, min(chunk_size, settings.UPLOAD_MAX_CHUNK_SIZE))
+
+    # URLの <uuid:upload_id> はハイフン付きの形式のみ受け付ける
+    upload_id = str(uuid.uuid4())
+    session = {
+        "upload_id": upload_id,
+        "filename": os.path.basename(filename),
+        "total_size": total_size,
+        "chunk_size": chunk_size,
+        "chunk_count": (total_size + chunk_size - 1) // chunk_size,
+        "created_at": time.time(),
+    }
+
+    os.makedirs(_session_dir(upload_id))
+    _save_session(session)
+
+    return session
+
+
+def _save_session(session):
+    """
+    セッション情報をアトミックに書き込む（書き込み途中のファイルを読ませない）
+    """
+    session_path = os.path.join(_session_dir(session["upload_id"]), SESSION_FILE)
+    temp_path = f"{session_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(session, f)
+    os.replace(temp_path, session_path)
+
+
+def load_upload_session(upload_id):
+    """
+    アップロードセッション情報を読み込む
+    """
+    session_path = os.path.join(_session_dir(upload_id), SESSION_FILE)
+    try:
+        with open(session_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        raise UploadSessionNotFound("アップロードセッションが見つかりません")
+
+
+def expected_chunk_length(session, index):
+    """
+    指定チャンクの期待バイト数を返す（最後のチャンクのみ短くなる）
+    """
+    if index < 0 or index >= session["chunk_count"]:
+        raise UploadError(f"チャンク番号が範囲外です（0-{session['chunk_count'] - 1}）")
+    start = index * session["chunk_size"]
+    return min(session["chunk_size"], session["total_size"] - start)
+
+
+def write_chunk(session, index, stream, content_length, expected_sha256):
+    """
+    リクエストボディのストリームからチャンクをディスクへ書き込む
+
+    ブロック単位で読み込みながらSHA-256を計算し、一致した場合のみ
+    チャンクファイルとして確定する（同じチャンクの再送は上書き）。
+
+    Args:
+        session (dict): セッション情報
+        index (int): チャンク番号（0始まり）
+        stream: read(n) を持つリクエストボディ
+        content_length (int): リクエストボディのバイト数
+        expected_sha256 (str): クライアントが計算したチャンクのSHA-256（16進）
+
+    Returns:
+        dict: {"index": int, "size": int, "sha256": str}
+    """
+    if session.get("assembled"):
+        raise UploadIncomplete("このアップロードは結合済みです")
+    expected_length = expected_chunk_length(session, index)
+    if content_length != expected_length:
+        raise UploadError(f"チャンクサイズが不正です（期待値 {expected_length} bytes, 受信 {content_length} bytes）")
+    if not expected_sha256:
+        raise UploadError("X-Chunk-SHA256 ヘッダーが必要です")
+
+    session_dir = _session_dir(session["upload_id"])
+    chunk_path = os.path.join(session_dir, CHUNK_FILE_FORMAT.format(index))
+    temp_path = f"{chunk_path}.{uuid.uuid4().hex}.tmp"
+
+    digest = hashlib.sha256()
+    received = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            while received < content_length:
+                block = stream.read(min(STREAM_BLOCK_SIZE, content_length - received))
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+                received += len(block)
+
+        if received != content_length:
+            raise UploadError(f"チャンクの受信が途中で終了しました（{received}/{content_length} bytes）")
+
+        actual_sha256 = digest.hexdigest()
+        if actual_sha256 != expected_sha256.strip().lower():
+            error = UploadError("チャンクのチェックサムが一致しません")
+            error.status_code = 422
+            raise error
+
+        # 検証済みのチャンクのみをアトミックに確定する
+        os.replace(temp_path, chunk_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return {"index": index, "size": received, "sha256": actual_sha256}
+
+
+def received_chunks(session):
+    """
+    受信済みのチャンク番号を昇順で返す（結合済みならすべて）
+    """
+    if session.get("assembled"):
+        return list(range(session["chunk_count"]))
+    session_dir = _session_dir(session["upload_id"])
+    indices = []
+    for index in range(session["chunk_count"]):
+        chunk_path = os.path.join(session_dir, CHUNK_FILE_FORMAT.format(index))
+        if os.path.exists(chunk_path):
+            indices.append(index)
+    return indices
+
+
+def received_ranges(session, indices=None):
+    """
+    受信済みのバイト範囲を [start, end)（endは含まない）のリストで返す
+    """
+    if indices is None:
+        indices = received_chunks(session)
+
+    ranges = []
+    for index in indices:
+        start = index * session["chunk_size"]
+        end = start + expected_chunk_length(session, index)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+class FinalizeInProgress(UploadIncomplete):
+    """
+    同じアップロードの結合・解析を別のリクエストが実行中
+    """
+
+
+class FinalizeLock:
+    """
+    同じアップロードの結合・解析を同時に1つだけ実行するための排他ロック
+
+    flock はプロセス終了時に自動で解放されるため、ワーカーが異常終了しても
+    再試行した finalize がロックを取得できる。解析をバックグラウンドスレッドで
+    続ける場合は、そのスレッドが解析後に release() する。
+    """
+
+    def __init__(self, upload_id):
+        self.upload_id = upload_id
+        self._lock_file = None
+
+    def acquire(self):
+        """
+        Raises:
+            UploadSessionNotFound: セッションが存在しない場合
+            FinalizeInProgress: 別のリクエストが結合・解析中の場合
+        """
+        session_dir = _session_dir(self.upload_id)
+        if not os.path.isdir(session_dir):
+            raise UploadSessionNotFound("アップロードセッションが見つかりません")
+        if not FCNTL_AVAILABLE:
+            return self
+
+        lock_file = open(os.path.join(session_dir, FINALIZE_LOCK_FILE), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise FinalizeInProgress("このアップロードは別のリクエストで結合・解析中です")
+        self._lock_file = lock_file
+        return self
+
+    def release(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def is_finalizing(upload_id):
+    """
+    結合・解析を実行中のリクエスト（またはバックグラウンド解析）があるか
+    """
+    try:
+        with FinalizeLock(upload_id):
+            return False
+    except FinalizeInProgress:
+        return True
+    except UploadError:
+        return False
+
+
+def assemble_upload(session, expected_sha256=None):
+    """
+    受信済みチャンクを結合して1つの動画ファイルを作成する
+
+    結合結果（ファイル名とSHA-256）は session.json に記録してからチャンクを
+    削除するため、解析中にワーカーが落ちても再試行時は結合済みファイルを再利用する。
+    FinalizeLock を取得してから呼び出すこと。
+
+    Args:
+        session (dict): セッション情報（結合結果が追記される）
+        expected_sha256 (str): ファイル全体のSHA-256（指定時のみ検証）
+
+    Returns:
+        tuple: (結合後のファイルパス, ファイル全体のSHA-256)
+    """
+    session_dir = _session_dir(session["upload_id"])
+    assembled = session.get("assembled")
+    if assembled:
+        assembled_path = os.path.join(session_dir, assembled["filename"])
+        if not os.path.exists(assembled_path):
+            raise UploadSessionNotFound("結合済みの動画ファイルが見つかりません。再度アップロードしてください")
+        _verify_sha256(assembled["sha256"], expected_sha256)
+        return assembled_path, assembled["sha256"]
+
+    indices = received_chunks(session)
+    missing = sorted(set(range(session["chunk_count"])) - set(indices))
+    if missing:
+        raise UploadIncomplete(f"未受信のチャンクがあります: {missing[:20]}")
+
+    extension = os.path.splitext(session["filename"])[1].lower()
+    assembled_filename = ASSEMBLED_FILE_PREFIX + extension
+    assembled_path = os.path.join(session_dir, assembled_filename)
+    temp_path = f"{assembled_path}.{uuid.uuid4().hex}.tmp"
+
+    digest = hashlib.sha256()
+    total = 0
+    try:
+        with open(temp_path, 'wb') as out:
+            for index in indices:
+                chunk_path = os.path.join(session_dir, CHUNK_FILE_FORMAT.format(index))
+                with open(chunk_path, 'rb') as f:
+                    while True:
+                        block = f.read(STREAM_BLOCK_SIZE)
+                        if not block:
+                            break
+                        digest.update(block)
+                        out.write(block)
+                        total += len(block)
+
+        content_hash = digest.hexdigest()
+        if total != session["total_size"]:
+            raise UploadError(f"結合後のファイルサイズが一致しません（{total}/{session['total_size']} bytes）")
+        _verify_sha256(content_hash, expected_sha256)
+
+        os.replace(temp_path, assembled_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    # 結合結果を記録してからチャンクを削除する（再試行時は結合済みファイルを再利用）
+    session["assembled"] = {"filename": assembled_filename, "sha256": content_hash}
+    _save_session(session)
+    for index in indices:
+        os.remove(os.path.join(session_dir, CHUNK_FILE_FORMAT.format(index)))
+
+    return assembled_path, content_hash
+
+
+def _verify_sha256(content_hash, expected_sha256):
+    if expected_sha256 and content_hash != expected_sha256.strip().lower():
+        error = UploadError("ファイル全体のチェックサムが一致しません")
+        error.status_code = 422
+        raise error
+
+
+def analysis_status(session, finalizing):
+    """
+    アップロードの解析状態を返す
+
+    finalizing は session を読み込む前に is_finalizing() で確認した値を渡す。
+    読み込んだ後に確認すると、その間に解析が終わった場合に結果もエラーもないまま
+    ロックが解放済みになり、pending と誤判定する。
+
+    Returns:
+        str: "completed"（結果あり）/ "processing"（解析中）/ "failed"（解析エラー、finalize で再試行可能）
+             / "pending"（未実行、またはワーカーの再起動などで中断。finalize で再開する）
+    """
+    if session.get("result") is not None:
+        return "completed"
+    if finalizing:
+        return "processing"
+    if session.get("error"):
+        return "failed"
+    return "pending"
+
+
+def fail_upload_session(session, message):
+    """
+    解析エラーを session.json に記録する（結合済みファイルは残し、finalize の再試行に備える）
+    """
+    session["error"] = message
+    _save_session(session)
+
+
+def complete_upload_session(session, result):
+    """
+    解析が完了したセッションの動画ファイルを削除し、結果を session.json に記録する
+
+    完了後に同じ finalize が再試行された場合は、記録した結果をそのまま返せる。
+    セッション自体は有効期限切れ時に purge_expired_sessions() で削除される。
+    """
+    session_dir = _session_dir(session["upload_id"])
+    session["result"] = result
+    session.pop("error", None)
+    _save_session(session)
+    for name in os.listdir(session_dir):
+        if name not in (SESSION_FILE, FINALIZE_LOCK_FILE):
+            try:
+                os.remove(os.path.join(session_dir, name))
+            except OSError:
+                continue
+
+
+def delete_upload_session(upload_id):
+    """
+    アップロードセッションのディレクトリを削除する
+    """
+    shutil.rmtree(_session_dir(upload_id), ignore_errors=True)
+
+
+def purge_expired_sessions(max_age=None):
+    """
+    有効期限切れのアップロードセッションを削除する
+
+    Returns:
+        int: 削除したセッション数
+    """
+    max_age = max_age if max_age is not None else settings.RESUMABLE_UPLOAD_EXPIRY_SECONDS
+    now = time.time()
+    purged = 0
+    upload_root = get_upload_root()
+    for name in os.listdir(upload_root):
+        session_dir = os.path.join(upload_root, name)
+        try:
+            if now - os.path.getmtime(session_dir) > max_age:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                purged += 1
+        except OSError:
+            continue
+    return purged
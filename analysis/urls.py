@@ -5,5 +5,16 @@ app_name = 'analysis'
 
 urlpatterns = [
     path('analyze/', views.analyze_running_video, name='analyze_running_video'),
+    path('uploads/', views.upload_initiate, name='upload_initiate'),
+    path('uploads/<uuid:upload_id>/', views.upload_status, name='upload_status'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/finalize/', views.upload_finalize, name='upload_finalize'),
+    path('runs/', views.run_list, name='run_list'),
+    path('runs/trends/', views.run_trends, name='run_trends'),
+    path('runs/<int:run_id>/', views.run_detail, name='run_detail'),
+    path('pose-backends/', views.pose_backend_list, name='pose_backend_list'),
+    path('admin/profiles/', views.profile_list, name='profile_list'),
+    path('admin/profiles/<uuid:profile_id>/', views.profile_detail, name='profile_detail'),
+    path('admin/profiles/<uuid:profile_id>/download/', views.profile_download, name='profile_download'),
     path('health/', views.health_check, name='health_check'),
 ] 
\ No newline at end of file
@@ -1,22 +1,36 @@
+import hashlib
 import os
 import tempfile
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from rest_framework.decorators import api_view, parser_classes
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework import status
 import logging
 import random
+import threading
 import time
 
+from . import admission, history, profiling, uploads
+from .permissions import IsProfilingAdmin
+from .pose_backends import POSE_BACKENDS, available_pose_backends, resolve_pose_backend_name
+from .serializers import RunDetailSerializer, RunSerializer
+from .services import PoseAnalysisError, run_video_analysis
+
 # ログ設定
 logger = logging.getLogger(__name__)
 
+# 対応している動画形式
+ALLOWED_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.m4v']
+
 
 def ultra_safe_analysis(filename="unknown", file_size=0):
     """
@@ -74,6 +88,120 @@ def ultra_safe_analysis(filename="unknown", file_size=0):
         }
 
 
+def _hash_uploaded_file(uploaded_file):
+    """
+    アップロードされたファイルのSHA-256をチャンク単位で計算する
+    """
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_history_params(request):
+    """
+    履歴保存用の runner_id と recorded_at（ISO 8601、任意）をリクエストから取得する
+    """
+    runner_id = str(request.data.get('runner_id') or '')[:64]
+    recorded_at = parse_datetime(str(request.data.get('recorded_at') or ''))
+    if recorded_at is not None and timezone.is_naive(recorded_at):
+        recorded_at = timezone.make_aware(recorded_at)
+    return runner_id, recorded_at
+
+
+def _get_pose_backend_param(request):
+    """
+    リクエストの pose_backend を解決する（未指定時は設定値、使用不可なら None）
+
+    クライアントが 'auto' 以外を明示した場合は、推定値へのフォールバックで
+    黙って別の結果を返さないよう、使用不可ならエラーにする。
+
+    Raises:
+        ValueError: 未知のバックエンド名、または使用できないバックエンドが指定された場合
+    """
+    requested = request.data.get('pose_backend') or None
+    return resolve_pose_backend_name(requested, require_available=requested is not None)
+
+
+def _is_pose_backend_requested(request):
+    """
+    クライアントが pose_backend を明示したか（その場合は別の解析方法の結果で代用しない）
+    """
+    return bool(request.data.get('pose_backend'))
+
+
+def _get_cache_method(request, pose_backend):
+    """
+    保存済み結果の検索に使う解析方法（クライアントがバックエンドを指定した場合のみ）
+    """
+    return pose_backend if _is_pose_backend_requested(request) else None
+
+
+def _pose_backend_error_response(error):
+    return Response({
+        "error": str(error),
+        "supported_backends": list(POSE_BACKENDS),
+        "available_backends": available_pose_backends()
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _pose_analysis_error_response(error, pose_backend):
+    return Response({
+        "error": str(error),
+        "pose_backend": pose_backend,
+    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _analyze_uploaded_file(uploaded_file, content_hash, pose_backend, require_backend=False):
+    """
+    アップロードされたファイルをディスク上のパスとして解析に渡す
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        return run_video_analysis(uploaded_file.temporary_file_path(), content_hash, pose_backend, require_backend)
+
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=extension) as temp_file:
+        for chunk in uploaded_file.chunks():
+            temp_file.write(chunk)
+        temp_file.flush()
+        return run_video_analysis(temp_file.name, content_hash, pose_backend, require_backend)
+
+
+def _profile_result_metadata(analysis_result):
+    """
+    プロファイルに付けるメタデータを解析結果から取り出す
+    """
+    return {
+        "method": analysis_result.get("method"),
+        "video_info": analysis_result.get("video_info"),
+        "series_fps": analysis_result.get("series_fps"),
+        "step_count": analysis_result.get("step_count"),
+    }
+
+
+def _with_profile_id(request, analysis_result, profile_id):
+    """
+    管理者用APIを参照できるリクエストにのみ、解析結果にプロファイルIDを付けて返す
+    """
+    if profile_id and IsProfilingAdmin().has_permission(request, None):
+        return {**analysis_result, "profile_id": profile_id}
+    return analysis_result
+
+
+def _save_history(analysis_result, content_hash, runner_id, filename, file_size, recorded_at):
+    """
+    解析結果を履歴に保存する（保存に失敗しても解析結果の返却は続ける）
+
+    ファイル情報からの推定値は実測ではないため、推移を歪めないよう保存しない。
+    """
+    if not content_hash or analysis_result.get("method") in history.ESTIMATED_METHODS:
+        return
+    try:
+        history.save_analysis_result(analysis_result, content_hash, runner_id, filename, file_size, recorded_at)
+    except Exception as e:
+        logger.error(f"解析結果の保存でエラー: {str(e)}")
+
+
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
 def analyze_running_video(request):
@@ -112,12 +240,11 @@ def analyze_running_video(request):
             # ファイル形式の簡易チェック（拡張子のみ）
             if filename:
                 file_extension = os.path.splitext(filename)[1].lower()
-                allowed_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.m4v']
                 
-                if file_extension not in allowed_extensions:
+                if file_extension not in ALLOWED_EXTENSIONS:
                     return Response({
                         "error": f"サポートされていないファイル形式です",
-                        "supported_formats": allowed_extensions,
+                        "supported_formats": ALLOWED_EXTENSIONS,
                         "uploaded_format": file_extension
                     }, status=status.HTTP_400_BAD_REQUEST)
             
@@ -128,11 +255,58 @@ def analyze_running_video(request):
             filename = "unknown_file"
             file_size = 1000000  # 1MBとして推定
         
+        try:
+            pose_backend = _get_pose_backend_param(request)
+        except ValueError as backend_error:
+            return _pose_backend_error_response(backend_error)
+        
+        # 同じ動画の保存済み結果があれば再解析しない
+        runner_id, recorded_at = _get_history_params(request)
+        content_hash = None
+        try:
+            content_hash = _hash_uploaded_file(video_file)
+            cached_result = history.reuse_cached_result(
+                content_hash, runner_id, filename, file_size, recorded_at, _get_cache_method(request, pose_backend)
+            )
+            if cached_result is not None:
+                logger.info(f"保存済みの解析結果を返却: {content_hash}")
+                return Response(cached_result, status=status.HTTP_200_OK)
+        except Exception as history_error:
+            logger.error(f"保存済み解析結果の検索でエラー: {str(history_error)}")
+        
+        # 姿勢推定バックエンドが使える環境では動画の内容を解析する
+        if pose_backend:
+            try:
+                with profiling.RequestProfile(request, {
+                    "filename": filename,
+                    "file_size": file_size,
+                    "content_hash": content_hash,
+                    "pose_backend": pose_backend,
+                }) as profile:
+                    analysis_result = _analyze_uploaded_file(
+                        video_file, content_hash, pose_backend, _is_pose_backend_requested(request)
+                    )
+                    profile.add_metadata(**_profile_result_metadata(analysis_result))
+                logger.info(f"動画解析完了: {analysis_result.get('method')}")
+                
+                analysis_result["content_hash"] = content_hash
+                _save_history(analysis_result, content_hash, runner_id, filename, file_size, recorded_at)
+                return Response(
+                    _with_profile_id(request, analysis_result, profile.profile_id), status=status.HTTP_200_OK
+                )
+            except PoseAnalysisError as pose_error:
+                # 明示されたバックエンドの失敗は推定値で代用せず、エラーとして返す
+                logger.error(f"姿勢推定解析でエラー: {str(pose_error)}")
+                return _pose_analysis_error_response(pose_error, pose_backend)
+            except Exception as pose_error:
+                logger.error(f"姿勢推定解析でエラー（Ultra Safe解析にフォールバック）: {str(pose_error)}")
+        
         # Ultra Safe解析実行（ファイル内容に一切触れない）
         try:
             analysis_result = ultra_safe_analysis(filename, file_size)
             logger.info(f"Ultra Safe解析完了: {analysis_result['method']}")
             
+            analysis_result["content_hash"] = content_hash
             return Response(analysis_result, status=status.HTTP_200_OK)
             
         except Exception as analysis_error:
@@ -163,6 +337,358 @@ def analyze_running_video(request):
         }, status=status.HTTP_200_OK)
 
 
+def _upload_error_response(error):
+    """
+    UploadError をAPIレスポンスに変換する
+    """
+    return Response({"error": str(error)}, status=error.status_code)
+
+
+@api_view(['POST'])
+def upload_initiate(request):
+    """
+    再開可能アップロードを開始するAPIエンドポイント
+
+    パラメータ: filename, total_size, chunk_size（任意）
+    """
+    filename = request.data.get('filename', '')
+    file_extension = os.path.splitext(filename)[1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        return Response({
+            "error": "サポートされていないファイル形式です",
+            "supported_formats": ALLOWED_EXTENSIONS,
+            "uploaded_format": file_extension
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        total_size = int(request.data.get('total_size', 0))
+        chunk_size = int(request.data['chunk_size']) if request.data.get('chunk_size') else None
+    except (TypeError, ValueError):
+        return Response({"error": "total_size / chunk_size は整数で指定してください"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        uploads.purge_expired_sessions()
+        session = uploads.create_upload_session(filename, total_size, chunk_size)
+    except uploads.UploadError as e:
+        return _upload_error_response(e)
+
+    logger.info(f"アップロード開始: {session['upload_id']}, {filename}, {total_size} bytes, "
+                f"{session['chunk_count']} チャンク")
+    return Response(session, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+def upload_status(request, upload_id):
+    """
+    受信済みチャンクとバイト範囲、解析状態（finalize 後は result）を返すAPIエンドポイント
+    """
+    try:
+        finalizing = uploads.is_finalizing(upload_id)
+        session = uploads.load_upload_session(upload_id)
+    except uploads.UploadError as e:
+        return _upload_error_response(e)
+
+    indices = uploads.received_chunks(session)
+    missing = sorted(set(range(session["chunk_count"])) - set(indices))
+    response_data = {
+        **session,
+        "analysis_status": uploads.analysis_status(session, finalizing),
+        "received_chunks": indices,
+        "received_ranges": uploads.received_ranges(session, indices),
+        "missing_chunks": missing,
+        "complete": not missing,
+    }
+    if not IsProfilingAdmin().has_permission(request, None):
+        response_data.pop("profile_id", None)
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+@api_view(['PUT'])
+@parser_classes([])
+def upload_chunk(request, upload_id, index):
+    """
+    チャンクを1つ受信するAPIエンドポイント
+
+    リクエストボディはチャンクの生データ、X-Chunk-SHA256 ヘッダーに
+    チャンクのSHA-256（16進）を指定する。ボディはストリームのまま
+    ディスクへ書き込む。
+    """
+    try:
+        session = uploads.load_upload_session(upload_id)
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        chunk = uploads.write_chunk(
+            session,
+            index,
+            request.stream if content_length else None,
+            content_length,
+            request.headers.get('X-Chunk-SHA256'),
+        )
+    except uploads.UploadError as e:
+        logger.warning(f"チャンク受信エラー: {upload_id}[{index}] {str(e)}")
+        return _upload_error_response(e)
+
+    return Response(chunk, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+def upload_finalize(request, upload_id):
+    """
+    チャンクを結合して解析を開始するAPIエンドポイント
+
+    結合と保存済み結果の検索はリクエスト内で行い、解析はワーカーのタイムアウトに
+    かからないようバックグラウンドで実行する（202 を返し、結果は upload_status で取得）。
+    解析済みなら結果を 200 で返すため、再試行しても同じ結果になる。
+
+    パラメータ: sha256（任意、ファイル全体のSHA-256）
+    """
+    try:
+        pose_backend = _get_pose_backend_param(request)
+    except ValueError as backend_error:
+        return _pose_backend_error_response(backend_error)
+
+    lock = uploads.FinalizeLock(upload_id)
+    try:
+        lock.acquire()
+    except uploads.FinalizeInProgress:
+        return _upload_processing_response(upload_id)
+    except uploads.UploadError as e:
+        return _upload_error_response(e)
+
+    try:
+        response, analysis = _prepare_upload_analysis(request, upload_id, pose_backend)
+    except uploads.UploadError as e:
+        lock.release()
+        logger.warning(f"アップロード結合エラー: {upload_id} {str(e)}")
+        return _upload_error_response(e)
+    except Exception:
+        lock.release()
+        raise
+
+    if analysis is None:
+        lock.release()
+        return response
+
+    # ロックとアドミッション制御の実行中登録はバックグラウンドの解析が終わるまで保持する
+    ticket = admission.defer_release(request)
+    threading.Thread(
+        target=_run_upload_analysis,
+        args=(lock, ticket, *analysis),
+        name=f'upload-analysis-{upload_id}',
+        daemon=True,
+    ).start()
+    return response
+
+
+def _upload_processing_response(upload_id):
+    return Response({
+        "upload_id": str(upload_id),
+        "analysis_status": "processing",
+        "message": "解析中です。GET /api/uploads/<upload_id>/ で結果を確認してください",
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+def _prepare_upload_analysis(request, upload_id, pose_backend):
+    """
+    FinalizeLock の中で結合と保存済み結果の検索を行う
+
+    Returns:
+        tuple: (レスポンス, バックグラウンド解析の引数。解析が不要なら None)
+    """
+    session = uploads.load_upload_session(upload_id)
+    if session.get("result") is not None:
+        logger.info(f"解析済みのアップロードの結果を返却: {upload_id}")
+        result = _with_profile_id(request, session["result"], session.get("profile_id"))
+        return Response(result, status=status.HTTP_200_OK), None
+
+    video_path, content_hash = uploads.assemble_upload(session, request.data.get('sha256'))
+    logger.info(f"アップロード完了: {upload_id}, sha256={content_hash}")
+
+    runner_id, recorded_at = _get_history_params(request)
+    filename, file_size = session["filename"], session["total_size"]
+    try:
+        cached_result = history.reuse_cached_result(
+            content_hash, runner_id, filename, file_size, recorded_at, _get_cache_method(request, pose_backend)
+        )
+    except Exception as history_error:
+        logger.error(f"保存済み解析結果の検索でエラー: {str(history_error)}")
+        cached_result = None
+    if cached_result is not None:
+        uploads.complete_upload_session(session, cached_result)
+        logger.info(f"保存済みの解析結果を返却: {content_hash}")
+        return Response(cached_result, status=status.HTTP_200_OK), None
+
+    profile = profiling.RequestProfile(request, {
+        "filename": filename,
+        "file_size": file_size,
+        "content_hash": content_hash,
+        "pose_backend": pose_backend,
+    })
+    analysis = (
+        session, video_path, content_hash, pose_backend, _is_pose_backend_requested(request), profile,
+        runner_id, recorded_at,
+    )
+    return _upload_processing_response(upload_id), analysis
+
+
+def _run_upload_analysis(lock, ticket, session, video_path, content_hash, pose_backend, require_backend, profile,
+                         runner_id, recorded_at):
+    """
+    アップロード動画をバックグラウンドで解析し、結果を session.json に記録する
+
+    明示されたバックエンドでの解析に失敗した場合は推定値で代用せず、解析状態を failed にする。
+    """
+    filename, file_size = session["filename"], session["total_size"]
+    cpu_start = time.thread_time()
+    try:
+        try:
+            with profile:
+                analysis_result = run_video_analysis(video_path, content_hash, pose_backend, require_backend)
+                profile.add_metadata(**_profile_result_metadata(analysis_result))
+        except PoseAnalysisError:
+            raise
+        except Exception as analysis_error:
+            logger.error(f"アップロード動画の解析でエラー: {str(analysis_error)}")
+            analysis_result = ultra_safe_analysis(filename, file_size)
+
+        analysis_result["content_hash"] = content_hash
+        # プロファイルIDは結果に含めず、管理者の状態確認・finalize にのみ返す
+        if profile.profile_id:
+            session["profile_id"] = profile.profile_id
+        analysis_result.setdefault("file_info", {
+            "filename": filename,
+            "size_mb": round(file_size / (1024 * 1024), 2)
+        })
+        _save_history(analysis_result, content_hash, runner_id, filename, file_size, recorded_at)
+        # 解析が終わるまでは結合済みファイルを残し、再試行に備える
+        uploads.complete_upload_session(session, analysis_result)
+        logger.info(f"アップロード動画の解析完了: {session['upload_id']}, {analysis_result.get('method')}")
+    except Exception as e:
+        logger.error(f"アップロード動画のバックグラウンド解析でエラー: {session['upload_id']} {str(e)}")
+        try:
+            uploads.fail_upload_session(session, str(e)[:200])
+        except Exception:
+            pass
+    finally:
+        lock.release()
+        if ticket is not None:
+            try:
+                ticket.release(time.thread_time() - cpu_start)
+            except Exception as e:
+                logger.error(f"アドミッション状態の解放でエラー: {str(e)}")
+        # このスレッド専用のDB接続を閉じる
+        connection.close()
+
+
+@api_view(['GET'])
+def run_list(request):
+    """
+    ランニング履歴の一覧を返すAPIエンドポイント（カーソルページネーション）
+
+    パラメータ: runner_id（必須）, cursor, page_size
+    """
+    runner_id = request.query_params.get('runner_id')
+    if not runner_id:
+        return Response({"error": "runner_id を指定してください"}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = history.runner_runs(runner_id)
+    paginator = history.RunCursorPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = RunSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+def run_detail(request, run_id):
+    """
+    ランニング1件の解析結果と区間指標を返すAPIエンドポイント
+    """
+    run = history.get_run(run_id)
+    if run is None:
+        return Response({"error": "ランニングが見つかりません"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(RunDetailSerializer(run).data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def run_trends(request):
+    """
+    ランナーのピッチ・前傾角度の推移を返すAPIエンドポイント
+
+    パラメータ: runner_id（必須）, period（day / week / month、既定は week）
+    """
+    runner_id = request.query_params.get('runner_id')
+    period = request.query_params.get('period', 'week')
+    if not runner_id:
+        return Response({"error": "runner_id を指定してください"}, status=status.HTTP_400_BAD_REQUEST)
+    if period not in history.TREND_PERIODS:
+        return Response({
+            "error": "period が不正です",
+            "supported_periods": list(history.TREND_PERIODS)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "runner_id": runner_id,
+        "period": period,
+        "trends": history.runner_trends(runner_id, period),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def pose_backend_list(request):
+    """
+    姿勢推定バックエンドの一覧と、この環境で使用可能なものを返すAPIエンドポイント
+    """
+    try:
+        default_backend = resolve_pose_backend_name()
+    except ValueError:
+        default_backend = None
+    return Response({
+        "backends": list(POSE_BACKENDS),
+        "available": available_pose_backends(),
+        "default": default_backend,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsProfilingAdmin])
+def profile_list(request):
+    """
+    保存済みのプロファイル一覧を返す管理者用APIエンドポイント
+    """
+    return Response({"profiles": profiling.list_profiles()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsProfilingAdmin])
+def profile_detail(request, profile_id):
+    """
+    プロファイルのメタデータと処理時間の多い関数を返す管理者用APIエンドポイント
+    """
+    profile_metadata = profiling.load_profile_metadata(profile_id)
+    if profile_metadata is None:
+        return Response({"error": "プロファイルが見つかりません"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(profile_metadata, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsProfilingAdmin])
+def profile_download(request, profile_id):
+    """
+    folded 形式のプロファイルをダウンロードする管理者用APIエンドポイント
+
+    flamegraph.pl / speedscope / inferno でフレームグラフとして表示できる。
+    """
+    path = profiling.folded_profile_path(profile_id)
+    if path is None:
+        return Response({"error": "プロファイルが見つかりません"}, status=status.HTTP_404_NOT_FOUND)
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=os.path.basename(path),
+        content_type='text/plain; charset=utf-8',
+    )
+
+
 @api_view(['GET'])
 def health_check(request):
     """
@@ -32,7 +32,8 @@ function App() {
     const apiUrl = 'https://running-analysis-api-v2.onrender.com';
     
     try {
-      const response = await axios.post(`${apiUrl}/api/analyze/`, formData, {
+      // 時系列はコンパクト形式（float32差分 + base64、表示用に間引き）で受け取る
+      const response = await axios.post(`${apiUrl}/api/analyze/?format=compact&max_points=300`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
@@ -110,6 +111,7 @@ function App() {
             average_lean_angle={analysisResult.average_lean_angle}
             note={analysisResult.note}
             method={analysisResult.method}
+            series={analysisResult.series}
           />
         )}
       </main>
@@ -1,4 +1,50 @@
 import React from 'react';
+import { decodeAllSeries } from '../utils/compactSeries';
+
+// 解析方法の表示名
+const METHOD_LABELS = {
+  opencv_basic: 'OpenCVベース解析',
+  onnx: 'ONNX Runtime姿勢推定解析',
+  ultra_safe_analysis: 'ファイル情報ベース推定',
+};
+
+// 時系列グラフの表示名
+const SERIES_LABELS = {
+  hip_y: '腰の上下動',
+  lean_angle: '前傾角度',
+  motion: 'モーション量',
+};
+
+/**
+ * 時系列を簡易的な折れ線グラフ（SVG）で表示する
+ */
+const SeriesChart = ({ label, values }) => {
+  if (!values || values.length < 2) {
+    return null;
+  }
+
+  const width = 300;
+  const height = 60;
+  const min = Math.min(...values);
+  const max = Math.max(...values);
+  const range = max - min || 1;
+  const points = values
+    .map((value, i) => {
+      const x = (i / (values.length - 1)) * width;
+      const y = height - ((value - min) / range) * height;
+      return `${x.toFixed(1)},${y.toFixed(1)}`;
+    })
+    .join(' ');
+
+  return (
+    <div className="series-chart">
+      <div className="series-label">{label}</div>
+      <svg viewBox={`0 0 ${width} ${height}`} preserveAspectRatio="none">
+        <polyline points={points} fill="none" stroke="#667eea" strokeWidth="1.5" />
+      </svg>
+    </div>
+  );
+};
 
 /**
  * ランニング動画解析結果を表示するコンポーネント
@@ -8,8 +54,9 @@ import React from 'react';
  * @param {number} props.average_lean_angle - 平均前傾角度
  * @param {string} props.note - 解析方法の説明（オプション）
  * @param {string} props.method - 使用された解析方法（オプション）
+ * @param {Object} props.series - フレームごとの時系列（JSON配列またはコンパクト形式、オプション）
  */
-const ResultDisplay = ({ step_count, average_lean_angle, note, method }) => {
+const ResultDisplay = ({ step_count, average_lean_angle, note, method, series }) => {
   // データが存在しない場合の処理
   if (step_count === undefined && average_lean_angle === undefined) {
     return (
@@ -39,6 +86,15 @@ const ResultDisplay = ({ step_count, average_lean_angle, note, method }) => {
         </div>
       </div>
       
+      {/* 時系列グラフ */}
+      {series && (
+        <div className="series-container">
+          {Object.entries(decodeAllSeries(series)).map(([name, values]) => (
+            <SeriesChart key={name} label={SERIES_LABELS[name] || name} values={values} />
+          ))}
+        </div>
+      )}
+
       {/* 解析方法の表示 */}
       {(note || method) && (
         <div className="analysis-info">
@@ -46,7 +102,7 @@ const ResultDisplay = ({ step_count, average_lean_angle, note, method }) => {
           {note && <p className="analysis-note">{note}</p>}
           {method && (
             <p className="analysis-method">
-              使用手法: {method === 'opencv_basic' ? 'OpenCVベース解析' : 'MediaPipe高精度解析'}
+              使用手法: {METHOD_LABELS[method] || (method.startsWith('mediapipe') ? 'MediaPipe高精度解析' : method)}
             </p>
           )}
         </div>
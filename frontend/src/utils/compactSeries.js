@@ -0,0 +1,53 @@
+/**
+ * コンパクト形式（?format=compact）の時系列データを復元するユーティリティ
+ *
+ * サーバーは各時系列を float32 の差分列（リトルエンディアン）として
+ * base64 エンコードして返すため、デコード後に累積和を取って元の値に戻す。
+ */
+
+export const COMPACT_SERIES_ENCODING = 'f32-delta-base64';
+
+/**
+ * 1つの時系列をデコードする
+ *
+ * @param {Object|Array} encoded - エンコード済みの時系列（配列の場合はそのまま返す）
+ * @returns {number[]} 復元した値の配列
+ */
+export const decodeSeries = (encoded) => {
+  if (Array.isArray(encoded)) {
+    return encoded;
+  }
+  if (!encoded || encoded.encoding !== COMPACT_SERIES_ENCODING) {
+    return [];
+  }
+
+  const binary = atob(encoded.data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i += 1) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+
+  const view = new DataView(bytes.buffer);
+  const values = new Array(encoded.count);
+  let current = 0;
+  for (let i = 0; i < encoded.count; i += 1) {
+    current += view.getFloat32(i * 4, true);
+    values[i] = current;
+  }
+  return values;
+};
+
+/**
+ * レスポンスの series オブジェクト全体をデコードする
+ *
+ * @param {Object} series - { 名前: エンコード済み時系列 }
+ * @returns {Object} { 名前: number[] }
+ */
+export const decodeAllSeries = (series) => {
+  if (!series) {
+    return {};
+  }
+  return Object.fromEntries(
+    Object.entries(series).map(([name, encoded]) => [name, decodeSeries(encoded)])
+  );
+};
@@ -27,8 +27,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'analysis.middleware.CompressionMiddleware',  # gzip / brotli 圧縮
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'analysis.middleware.AdmissionControlMiddleware',  # 本文を読む前に負荷制御
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -111,6 +113,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
+        'analysis.renderers.CompactSeriesRenderer',  # ?format=compact
     ],
 }
 
@@ -142,6 +145,9 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-chunk-sha256',
+    'x-api-key',
+    'x-profile-token',
 ]
 CORS_ALLOW_METHODS = [
     'DELETE',
@@ -156,6 +162,71 @@ CORS_ALLOW_METHODS = [
 FILE_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
 
+# 再開可能（チャンク分割）アップロード設定
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.environ.get('RESUMABLE_UPLOAD_MAX_MB', '1024')) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE_MB', '8')) * 1024 * 1024
+UPLOAD_MIN_CHUNK_SIZE = 256 * 1024  # 256KB
+UPLOAD_MAX_CHUNK_SIZE = 32 * 1024 * 1024  # 32MB
+RESUMABLE_UPLOAD_EXPIRY_SECONDS = 24 * 60 * 60  # 24時間
+
+# 解析用プロキシ動画（解像度・FPS・コーデックの正規化）設定
+VIDEO_PROXY_ENABLED = os.environ.get('VIDEO_PROXY_ENABLED', 'True') == 'True'
+VIDEO_PROXY_MAX_HEIGHT = int(os.environ.get('VIDEO_PROXY_MAX_HEIGHT', '480'))
+VIDEO_PROXY_FPS = int(os.environ.get('VIDEO_PROXY_FPS', '30'))
+VIDEO_PROXY_QUALITY = 5  # MJPEGの品質（2-31、小さいほど高画質）
+VIDEO_PROXY_TIMEOUT_SECONDS = 300
+VIDEO_PROXY_CACHE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60  # 7日間
+
+# 姿勢推定バックエンド設定
+# 'auto' / 'mediapipe-lite' / 'mediapipe-full' / 'mediapipe-heavy' / 'onnx'
+POSE_BACKEND = os.environ.get('POSE_BACKEND', 'auto')
+POSE_ONNX_MODEL_PATH = os.environ.get('POSE_ONNX_MODEL_PATH', str(BASE_DIR / 'models' / 'movenet_singlepose_lightning.onnx'))
+# manage.py fetch_pose_model で取得するモデルの固定URLとSHA-256（両方そろわないとダウンロードしない）
+POSE_ONNX_MODEL_URL = os.environ.get('POSE_ONNX_MODEL_URL', '')
+POSE_ONNX_MODEL_SHA256 = os.environ.get('POSE_ONNX_MODEL_SHA256', '')
+POSE_ONNX_BATCH_SIZE = int(os.environ.get('POSE_ONNX_BATCH_SIZE', '8'))
+POSE_ONNX_NUM_THREADS = int(os.environ.get('POSE_ONNX_NUM_THREADS', '2'))
+POSE_MIN_KEYPOINT_SCORE = 0.3
+
+# アドミッション制御（解析エンドポイントのレート制限・同時実行上限）
+ADMISSION_CONTROL = {
+    'ENABLED': os.environ.get('ADMISSION_CONTROL_ENABLED', 'True') == 'True',
+    # 'sqlite': gunicornの複数ワーカー間で共有 / 'memory': プロセス内のみ
+    'STORE': os.environ.get('ADMISSION_STORE', 'sqlite'),
+    'SQLITE_PATH': BASE_DIR / 'admission.sqlite3',
+    # クライアント別トークンバケット（単位: 推定CPU秒）
+    'CLIENT_BURST_CPU_SECONDS': float(os.environ.get('ADMISSION_CLIENT_BURST_CPU_SECONDS', '300')),
+    'CLIENT_REFILL_CPU_SECONDS_PER_SECOND': float(os.environ.get('ADMISSION_CLIENT_REFILL_RATE', '0.2')),
+    # サーバー全体の実行中上限
+    'MAX_CONCURRENT_ANALYSES': int(os.environ.get('ADMISSION_MAX_CONCURRENT_ANALYSES', '2')),
+    'MAX_INFLIGHT_BYTES': int(os.environ.get('ADMISSION_MAX_INFLIGHT_MB', '300')) * 1024 * 1024,
+    'MAX_INFLIGHT_CPU_SECONDS': float(os.environ.get('ADMISSION_MAX_INFLIGHT_CPU_SECONDS', '600')),
+    # コスト見積もり
+    'BASE_CPU_SECONDS': 1.0,
+    'CPU_SECONDS_PER_MB': 2.0,
+    'UPLOAD_CPU_SECONDS_PER_MB': 0.02,
+    # 解析リクエストの動画サイズに対する返却しない課金（実測CPU秒が小さくても差し引かれる）
+    'ANALYSIS_FIXED_CPU_SECONDS_PER_MB': 0.5,
+    # ワーカー異常終了時に実行中の登録を破棄するまでの秒数
+    'INFLIGHT_TTL_SECONDS': 900,
+    # Render等のリバースプロキシ配下では X-Forwarded-For の右から TRUSTED_PROXY_COUNT 番目を
+    # クライアントIPとみなす（それより左はクライアントが偽装できる）
+    'TRUST_X_FORWARDED_FOR': os.environ.get('ADMISSION_TRUST_X_FORWARDED_FOR', 'True') == 'True',
+    'TRUSTED_PROXY_COUNT': int(os.environ.get('ADMISSION_TRUSTED_PROXY_COUNT', '1')),
+    # クライアント識別に使う X-API-Key（カンマ区切り、未登録のキーはIPアドレス扱い）
+    'API_KEYS': {key.strip() for key in os.environ.get('ADMISSION_API_KEYS', '').split(',') if key.strip()},
+}
+
+# プロファイリング設定（解析処理のサンプリングプロファイル）
+# X-Profile-Token ヘッダーがこの値と一致するリクエストをプロファイルし、管理者用APIの参照も許可する
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+# 解析リクエストを確率的にプロファイルする割合（0.0-1.0）
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL_SECONDS = 0.005  # サンプリング間隔（5ms）
+PROFILING_MAX_PROFILES = 200
+# プロファイルの保存先（DEBUG時に公開配信される MEDIA_ROOT の外に置く）
+PROFILING_DIR = os.environ.get('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+
 # ログ設定
 LOGGING = {
     'version': 1,